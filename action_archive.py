@@ -0,0 +1,498 @@
+"""Compressed, segmented archive of raw Hyperion actions with on-disk indexes
+
+Every ingested action is appended to the active segment. A segment is a
+run of independently zlib-compressed blocks, each holding up to
+``block_actions`` NDJSON lines. When a segment is sealed, three sorted
+fixed-width index files are written next to it:
+
+    seg-00000001.dat          [u32 compressed length][u32 count][zlib NDJSON] ...
+    seg-00000001.seq.idx      (global_sequence, block offset) records
+    seg-00000001.trx.idx      (hash of trx_id, block offset) records
+    seg-00000001.wallet.idx   (hash of wallet, block offset) records
+    seg-00000001.meta.json    sequence/time range and sizes; written last
+
+Lookups memory-map the index files and binary-search them. They then
+decompress only the blocks that match, so memory use does not grow with
+the archive. Old segments are deleted by age (retention), and runs of
+small segments are merged (compaction).
+
+Query an archive from the command line:
+
+    python3 action_archive.py action_archive --wallet alice.wam --days 7
+    python3 action_archive.py action_archive --trx 8f3c...
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from hyperion_data import parse_chain_time
+
+RECORD = struct.Struct('<QQ')  # (key, block offset)
+BLOCK_HEADER = struct.Struct('<II')  # (compressed length, action count)
+INDEXES = ('seq', 'trx', 'wallet')
+
+
+def key_hash(text):
+    """Stable 64-bit key for a string (trx_id or wallet); matches are verified after decoding"""
+    return int.from_bytes(hashlib.blake2b(str(text).encode(), digest_size=8).digest(), 'little')
+
+
+def block_time(action):
+    """Epoch seconds of an action's block timestamp, or 0 if it has none"""
+    timestamp = action.get('@timestamp') or action.get('timestamp')
+    if not timestamp:
+        return 0.0
+    return parse_chain_time(timestamp).timestamp()
+
+
+# ------------------------------------------------------------------
+# 1.  Segments
+# ------------------------------------------------------------------
+class Segment:
+    """A sealed, read-only segment with memory-mapped indexes"""
+
+    def __init__(self, directory, name, meta):
+        self.directory = directory
+        self.name = name
+        self.meta = meta
+        self.maps = {}  # {index: mmap or None for an empty index}
+
+    def path(self, suffix):
+        return os.path.join(self.directory, f"{self.name}{suffix}")
+
+    def index_map(self, index):
+        if index not in self.maps:
+            with open(self.path(f".{index}.idx"), 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                self.maps[index] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        return self.maps[index]
+
+    def offsets(self, index, key):
+        """Block offsets of every record with this key, by binary search over the mmap"""
+        data = self.index_map(index)
+        if data is None:
+            return []
+        low, high = 0, len(data) // RECORD.size
+        while low < high:
+            middle = (low + high) // 2
+            if RECORD.unpack_from(data, middle * RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        offsets = []
+        position = low
+        while position < len(data) // RECORD.size:
+            record_key, offset = RECORD.unpack_from(data, position * RECORD.size)
+            if record_key != key:
+                break
+            offsets.append(offset)
+            position += 1
+        return sorted(set(offsets))
+
+    def read_blocks(self, offsets):
+        """Decoded actions of the blocks at the given offsets"""
+        actions = []
+        with open(self.path('.dat'), 'rb') as f:
+            for offset in offsets:
+                actions.extend(read_block(f, offset)[0])
+        return actions
+
+    def overlaps(self, since, until):
+        return (since is None or self.meta['last_time'] >= since) and (until is None or self.meta['first_time'] <= until)
+
+    def close(self):
+        for data in self.maps.values():
+            if data is not None:
+                data.close()
+        self.maps.clear()
+
+
+def read_block(f, offset):
+    """(actions, next offset) of the block at offset, or ([], None) at a torn or missing block"""
+    f.seek(offset)
+    header = f.read(BLOCK_HEADER.size)
+    if len(header) < BLOCK_HEADER.size:
+        return [], None
+    length, count = BLOCK_HEADER.unpack(header)
+    payload = f.read(length)
+    if len(payload) < length:
+        return [], None
+    lines = zlib.decompress(payload).decode('utf-8').splitlines()
+    if len(lines) != count:
+        return [], None
+    return [json.loads(line) for line in lines], offset + BLOCK_HEADER.size + length
+
+
+class SegmentWriter:
+    """The active segment: appends compressed blocks and keeps its index in memory
+
+    With writable=False it only indexes an existing segment for reading and
+    never opens it for writing.
+    """
+
+    def __init__(self, directory, name, wallet_fields, compression_level, writable=True):
+        self.directory = directory
+        self.name = name
+        self.wallet_fields = wallet_fields
+        self.compression_level = compression_level
+        self.file = open(os.path.join(directory, f"{name}.dat"), 'ab') if writable else None
+        self.offset = self.file.tell() if writable else 0
+        self.records = {index: [] for index in INDEXES}
+        self.meta = {
+            'first_sequence': None, 'last_sequence': None,
+            'first_time': None, 'last_time': None,
+            'actions': 0, 'blocks': 0, 'bytes': self.offset,
+            'created_at': time.time()
+        }
+
+    def index_block(self, actions, offset):
+        for action in actions:
+            global_sequence = int(action['global_sequence'])
+            moment = block_time(action)
+            self.records['seq'].append((global_sequence, offset))
+            if action.get('trx_id'):
+                self.records['trx'].append((key_hash(action['trx_id']), offset))
+            for wallet in wallets_of(action, self.wallet_fields):
+                self.records['wallet'].append((key_hash(wallet), offset))
+            meta = self.meta
+            meta['first_sequence'] = global_sequence if meta['first_sequence'] is None else min(meta['first_sequence'], global_sequence)
+            meta['last_sequence'] = global_sequence if meta['last_sequence'] is None else max(meta['last_sequence'], global_sequence)
+            meta['first_time'] = moment if meta['first_time'] is None else min(meta['first_time'], moment)
+            meta['last_time'] = moment if meta['last_time'] is None else max(meta['last_time'], moment)
+        self.meta['actions'] += len(actions)
+        self.meta['blocks'] += 1
+
+    def write_block(self, actions):
+        payload = zlib.compress(
+            '\n'.join(json.dumps(action, separators=(',', ':')) for action in actions).encode('utf-8'),
+            self.compression_level
+        )
+        offset = self.offset
+        self.file.write(BLOCK_HEADER.pack(len(payload), len(actions)))
+        self.file.write(payload)
+        self.file.flush()
+        self.offset += BLOCK_HEADER.size + len(payload)
+        self.meta['bytes'] = self.offset
+        self.index_block(actions, offset)
+
+    def recover(self):
+        """Re-index an unsealed segment; when writable, also drop any torn trailing block"""
+        with open(os.path.join(self.directory, f"{self.name}.dat"), 'rb') as f:
+            offset = 0
+            while True:
+                actions, next_offset = read_block(f, offset)
+                if next_offset is None:
+                    break
+                self.index_block(actions, offset)
+                offset = next_offset
+        if self.file:
+            self.file.truncate(offset)
+        self.offset = offset
+        self.meta['bytes'] = offset
+
+    def lookup(self, index, key):
+        """Offsets matching a key in the unsealed index"""
+        return sorted({offset for record_key, offset in self.records[index] if record_key == key})
+
+    def seal(self):
+        """Write the sorted index files, then the meta file that marks the segment complete"""
+        self.file.close()
+        for index, records in self.records.items():
+            records.sort()
+            path = os.path.join(self.directory, f"{self.name}.{index}.idx")
+            with open(path, 'wb') as f:
+                for record in records:
+                    f.write(RECORD.pack(*record))
+        meta_path = os.path.join(self.directory, f"{self.name}.meta.json")
+        with open(f"{meta_path}.tmp", 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        return Segment(self.directory, self.name, self.meta)
+
+
+def wallets_of(action, wallet_fields):
+    data = action.get('act', {}).get('data', {})
+    if not isinstance(data, dict):
+        return []
+    return {data[field] for field in wallet_fields if isinstance(data.get(field), str) and data[field]}
+
+
+# ------------------------------------------------------------------
+# 2.  Archive
+# ------------------------------------------------------------------
+class ActionArchive:
+    """Append-only action archive with lookups by trx_id, global_sequence and wallet
+
+    ``append`` only buffers, so it is safe to call on the event loop.
+    ``flush`` compresses and writes the buffer and is meant to run in a
+    worker thread. A lock makes flushes, lookups and maintenance safe to
+    run concurrently; a separate pending lock guards only the buffer, so
+    ``append`` never waits on a write.
+
+    Only one process may open an archive writable. Open it with
+    read_only=True (as the command line does) to query it while the bot is
+    running: unsealed segments are then indexed in memory, never
+    recovered, truncated or sealed.
+    """
+
+    def __init__(self, directory, block_actions=256, segment_bytes=64 * 1024 * 1024,
+                 segment_seconds=86400, wallet_fields=('from', 'owner'), compression_level=6, read_only=False):
+        self.directory = directory
+        self.block_actions = block_actions
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.wallet_fields = tuple(wallet_fields)
+        self.compression_level = compression_level
+        self.lock = threading.RLock()
+        self.pending_lock = threading.Lock()  # Guards pending and pending_since
+        self.read_only = read_only
+        self.pending = []
+        self.pending_since = None  # When the oldest buffered action was appended
+        self.segments = []
+        self.unsealed = []  # Read-only: SegmentWriters indexing segments another process is writing
+        self.writer = None
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        self.open_segments()
+
+    def segment_names(self):
+        return sorted(name[:-4] for name in os.listdir(self.directory) if name.startswith('seg-') and name.endswith('.dat'))
+
+    def open_segments(self):
+        for name in self.segment_names():
+            meta_path = os.path.join(self.directory, f"{name}.meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path, 'r') as f:
+                    self.segments.append(Segment(self.directory, name, json.load(f)))
+            elif self.read_only:
+                # Probably the running bot's active segment; index what is there so far
+                writer = SegmentWriter(self.directory, name, self.wallet_fields, self.compression_level, writable=False)
+                writer.recover()
+                self.unsealed.append(writer)
+            else:
+                # Crashed while active (or mid-compaction): rebuild its index and seal it
+                writer = SegmentWriter(self.directory, name, self.wallet_fields, self.compression_level)
+                writer.recover()
+                if writer.meta['actions']:
+                    self.segments.append(writer.seal())
+                else:
+                    writer.file.close()
+                    self.remove_files(name)
+
+    def next_name(self):
+        names = self.segment_names()
+        number = int(names[-1].split('-')[1]) + 1 if names else 1
+        return f"seg-{number:08d}"
+
+    def remove_files(self, name):
+        for suffix in ('.dat', '.meta.json', *(f".{index}.idx" for index in INDEXES)):
+            try:
+                os.remove(os.path.join(self.directory, f"{name}{suffix}"))
+            except FileNotFoundError:
+                pass
+
+    # Writing
+    def check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"action archive {self.directory} is open read-only")
+
+    def append(self, action):
+        """Buffer an action for the next flush"""
+        self.check_writable()
+        with self.pending_lock:
+            if not self.pending:
+                self.pending_since = time.monotonic()
+            self.pending.append(action)
+
+    def flush(self, max_wait=0):
+        """Write buffered actions as compressed blocks
+
+        A tail shorter than a full block stays buffered, to be packed with
+        later actions, until its oldest action has waited max_wait seconds.
+        """
+        self.check_writable()
+        with self.lock:
+            with self.pending_lock:
+                since = self.pending_since
+                pending, self.pending = self.pending, []
+                self.pending_since = None
+            hold = since is not None and time.monotonic() - since < max_wait
+            try:
+                while pending:
+                    if hold and len(pending) < self.block_actions:
+                        break
+                    if self.writer is None:
+                        self.writer = SegmentWriter(self.directory, self.next_name(), self.wallet_fields, self.compression_level)
+                    self.writer.write_block(pending[:self.block_actions])
+                    pending = pending[self.block_actions:]
+                    if self.writer.offset >= self.segment_bytes:
+                        self.seal()
+            finally:
+                if pending:
+                    # The held tail, or what a failed write left; actions
+                    # appended since the swap go after it
+                    with self.pending_lock:
+                        self.pending[:0] = pending
+                        self.pending_since = since
+
+    def seal(self):
+        """Seal the active segment so its index goes to disk"""
+        with self.lock:
+            if self.writer is None:
+                return
+            writer, self.writer = self.writer, None
+            if writer.meta['actions']:
+                self.segments.append(writer.seal())
+            else:
+                writer.file.close()
+                self.remove_files(writer.name)
+
+    def close(self):
+        if not self.read_only:
+            self.flush()
+            self.seal()
+        for segment in self.segments:
+            segment.close()
+
+    # Reading
+    def lookup(self, index, key, match, since=None, until=None, limit=None):
+        """Actions whose index key matches and that pass ``match``, oldest first"""
+        with self.lock:
+            found = {}
+            sources = [(segment.offsets(index, key), segment.read_blocks) for segment in self.segments
+                       if segment.overlaps(since, until)]
+            for writer in [self.writer, *self.unsealed]:
+                offsets = writer.lookup(index, key) if writer else None
+                if offsets:
+                    segment = Segment(self.directory, writer.name, writer.meta)
+                    sources.append((offsets, segment.read_blocks))
+            for offsets, read_blocks in sources:
+                if not offsets:
+                    continue
+                for action in read_blocks(offsets):
+                    if match(action):
+                        found[(action.get('network'), int(action['global_sequence']))] = action
+            for action in self.pending:
+                if match(action):
+                    found[(action.get('network'), int(action['global_sequence']))] = action
+
+        actions = sorted(found.values(), key=lambda action: int(action['global_sequence']))
+        if since is not None or until is not None:
+            actions = [action for action in actions
+                       if (since is None or block_time(action) >= since) and (until is None or block_time(action) <= until)]
+        return actions[-limit:] if limit else actions
+
+    def by_sequence(self, global_sequence):
+        global_sequence = int(global_sequence)
+        return self.lookup('seq', global_sequence, lambda action: int(action['global_sequence']) == global_sequence)
+
+    def by_trx(self, trx_id):
+        return self.lookup('trx', key_hash(trx_id), lambda action: action.get('trx_id') == trx_id)
+
+    def by_wallet(self, wallet, since=None, until=None, limit=None):
+        return self.lookup(
+            'wallet', key_hash(wallet), lambda action: wallet in wallets_of(action, self.wallet_fields),
+            since=since, until=until, limit=limit
+        )
+
+    # Maintenance
+    def apply_retention(self, max_age_seconds):
+        """Delete sealed segments whose newest action is older than max_age_seconds"""
+        self.check_writable()
+        cutoff = time.time() - max_age_seconds
+        with self.lock:
+            expired = [segment for segment in self.segments if segment.meta['last_time'] < cutoff]
+            for segment in expired:
+                segment.close()
+                self.remove_files(segment.name)
+                self.segments.remove(segment)
+        return len(expired)
+
+    def seal_if_old(self):
+        """Seal the active segment once it has been open for segment_seconds"""
+        with self.lock:
+            if self.writer and time.time() - self.writer.meta['created_at'] >= self.segment_seconds:
+                self.seal()
+
+    def compact(self, min_segment_bytes):
+        """Merge runs of adjacent small sealed segments into one, dropping duplicate actions"""
+        self.check_writable()
+        merged = 0
+        with self.lock:
+            runs, run = [], []
+            for segment in self.segments:
+                if segment.meta['bytes'] < min_segment_bytes:
+                    run.append(segment)
+                else:
+                    runs.append(run)
+                    run = []
+            runs.append(run)
+
+            for run in runs:
+                if len(run) < 2:
+                    continue
+                writer = SegmentWriter(self.directory, self.next_name(), self.wallet_fields, self.compression_level)
+                seen = set()
+                block = []
+                for segment in run:
+                    with open(segment.path('.dat'), 'rb') as f:
+                        offset = 0
+                        while offset is not None:
+                            actions, offset = read_block(f, offset)
+                            for action in actions:
+                                key = (action.get('network'), int(action['global_sequence']))
+                                if key not in seen:
+                                    seen.add(key)
+                                    block.append(action)
+                            while len(block) >= self.block_actions:
+                                writer.write_block(block[:self.block_actions])
+                                block = block[self.block_actions:]
+                if block:
+                    writer.write_block(block)
+                replacement = writer.seal()
+                position = self.segments.index(run[0])
+                for segment in run:
+                    segment.close()
+                    self.remove_files(segment.name)
+                    self.segments.remove(segment)
+                self.segments.insert(position, replacement)
+                merged += len(run)
+        return merged
+
+
+# ------------------------------------------------------------------
+# 3.  Entry-point
+# ------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Look up actions in an action archive")
+    parser.add_argument('directory', help="Archive directory (archive.path in config.yml)")
+    parser.add_argument('--trx', help="Transaction ID")
+    parser.add_argument('--sequence', type=int, help="Action global_sequence")
+    parser.add_argument('--wallet', help="Wallet (from/owner)")
+    parser.add_argument('--days', type=float, help="Only actions from the last N days (with --wallet)")
+    parser.add_argument('--limit', type=int, help="Only the newest N actions (with --wallet)")
+    args = parser.parse_args()
+
+    # The bot may be writing to the archive; never recover or seal its active segment
+    archive = ActionArchive(args.directory, read_only=True)
+    if args.trx:
+        actions = archive.by_trx(args.trx)
+    elif args.sequence is not None:
+        actions = archive.by_sequence(args.sequence)
+    elif args.wallet:
+        since = time.time() - args.days * 86400 if args.days else None
+        actions = archive.by_wallet(args.wallet, since=since, limit=args.limit)
+    else:
+        parser.error("one of --trx, --sequence or --wallet is required")
+    for action in actions:
+        print(json.dumps(action))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Embedded time-series store of action counts with per-minute/hour/day rollups
+
+Each ingested action increments counters in three rollups (minute, hour
+and day buckets), once for its wallet and once for the all-wallet total
+(wallet ''). Increments are batched in memory. ``flush`` upserts them
+into sqlite, so the stored rollups are always complete and a query never
+touches raw actions:
+
+    rollups(network, resolution, action, wallet, bucket) -> count
+
+A query reads one rollup over a fixed window (the last hour in minutes,
+the last day in hours, the last week or month in days). It is a range
+scan over at most that window's rows, so its cost does not grow with
+history length. Fine rollups are pruned by age; day rollups are kept.
+
+Inspect a store from the command line:
+
+    python3 activity_stats.py activity_stats.db --action claim --period day
+"""
+import argparse
+import sqlite3
+import threading
+import time
+
+RESOLUTIONS = {'minute': 60, 'hour': 3600, 'day': 86400}
+PERIODS = {  # period: (buckets, resolution)
+    'hour': (60, 'minute'),
+    'day': (24, 'hour'),
+    'week': (7, 'day'),
+    'month': (30, 'day')
+}
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    network TEXT NOT NULL,
+    resolution INTEGER NOT NULL,  -- bucket width in seconds
+    action TEXT NOT NULL,
+    wallet TEXT NOT NULL,  -- '' for the all-wallet total
+    bucket INTEGER NOT NULL,  -- bucket start, epoch seconds
+    count INTEGER NOT NULL,
+    PRIMARY KEY (network, resolution, action, wallet, bucket)
+) WITHOUT ROWID;
+-- Covers top-wallet queries: a bucket range across all wallets of an action
+CREATE INDEX IF NOT EXISTS rollups_by_bucket ON rollups (network, resolution, action, bucket, wallet, count);
+"""
+
+
+class ActivityStats:
+    """Rollup store; ``record`` is cheap enough for the event loop, the rest belongs in a worker thread"""
+
+    def __init__(self, path, retention=None):
+        self.path = path
+        self.retention = retention or {'minute': 2 * 86400, 'hour': 90 * 86400}  # {resolution: seconds}
+        self.lock = threading.Lock()  # Serialises use of the sqlite connection
+        # Guards pending only, so record never waits on a database write
+        self.pending_lock = threading.Lock()
+        self.pending = {}  # {(network, resolution, action, wallet, bucket): increment}
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def record(self, network, action, wallet, timestamp):
+        """Count one action at an epoch timestamp"""
+        with self.pending_lock:
+            pending = self.pending
+            for width in RESOLUTIONS.values():
+                bucket = int(timestamp) // width * width
+                for who in (wallet, '') if wallet else ('',):
+                    key = (network, width, action, who, bucket)
+                    pending[key] = pending.get(key, 0) + 1
+
+    def flush(self):
+        """Upsert the batched increments, returning how many rollup rows changed"""
+        with self.pending_lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        try:
+            with self.lock, self.db:
+                self.db.executemany(
+                    "INSERT INTO rollups (network, resolution, action, wallet, bucket, count) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (network, resolution, action, wallet, bucket) DO UPDATE SET count = count + excluded.count",
+                    [(*key, count) for key, count in pending.items()]
+                )
+        except Exception:
+            # Keep the increments for the next flush
+            with self.pending_lock:
+                for key, count in pending.items():
+                    self.pending[key] = self.pending.get(key, 0) + count
+            raise
+        return len(pending)
+
+    def prune(self, now=None):
+        """Drop minute and hour rollups older than their retention"""
+        now = now or time.time()
+        removed = 0
+        with self.lock, self.db:
+            for resolution, seconds in self.retention.items():
+                if seconds:
+                    cursor = self.db.execute(
+                        "DELETE FROM rollups WHERE resolution = ? AND bucket < ?",
+                        (RESOLUTIONS[resolution], now - seconds)
+                    )
+                    removed += cursor.rowcount
+        return removed
+
+    def window(self, period, now=None):
+        """(resolution seconds, first bucket, bucket count) covering a period up to now"""
+        buckets, resolution = PERIODS[period]
+        width = RESOLUTIONS[resolution]
+        last = int(now or time.time()) // width * width
+        return width, last - (buckets - 1) * width, buckets
+
+    def series(self, network, actions, period, wallet=None, now=None):
+        """[(bucket start, count)] for every bucket in the period, oldest first, zeros included"""
+        width, first, buckets = self.window(period, now)
+        placeholders = ','.join('?' * len(actions))
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT bucket, SUM(count) FROM rollups WHERE network = ? AND resolution = ? "
+                f"AND action IN ({placeholders}) AND wallet = ? AND bucket >= ? GROUP BY bucket",
+                (network, width, *actions, wallet or '', first)
+            ).fetchall()
+        counts = dict(rows)
+        return [(bucket, counts.get(bucket, 0)) for bucket in range(first, first + buckets * width, width)]
+
+    def top_wallets(self, network, actions, period, limit=10, now=None):
+        """[(wallet, count)] of the most active wallets in the period"""
+        width, first, _ = self.window(period, now)
+        placeholders = ','.join('?' * len(actions))
+        with self.lock:
+            return self.db.execute(
+                f"SELECT wallet, SUM(count) AS total FROM rollups INDEXED BY rollups_by_bucket "
+                f"WHERE network = ? AND resolution = ? AND action IN ({placeholders}) AND bucket >= ? AND wallet != '' "
+                f"GROUP BY wallet ORDER BY total DESC, wallet LIMIT ?",
+                (network, width, *actions, first, limit)
+            ).fetchall()
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print rollups from an activity stats store")
+    parser.add_argument('path', help="sqlite file (stats.path in config.yml)")
+    parser.add_argument('--network', default='mainnet')
+    parser.add_argument('--action', nargs='+', default=['claim'])
+    parser.add_argument('--period', choices=PERIODS, default='day')
+    parser.add_argument('--wallet')
+    args = parser.parse_args()
+
+    stats = ActivityStats(args.path)
+    for bucket, count in stats.series(args.network, args.action, args.period, args.wallet):
+        print(f"{time.strftime('%Y-%m-%d %H:%M', time.gmtime(bucket))}  {count}")
+    if not args.wallet:
+        print("Top wallets:")
+        for wallet, count in stats.top_wallets(args.network, args.action, args.period):
+            print(f"  {wallet:<13} {count}")
+
+
+if __name__ == "__main__":
+    main()
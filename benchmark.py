@@ -0,0 +1,336 @@
+"""Ingest pipeline benchmark: Hyperion payloads in, Discord messages out, no network
+
+Feeds recorded or synthetic get_actions payloads through the bot's real
+parse -> dedup -> render -> dispatch path. Discord is replaced by an
+in-process sink. Reports throughput, per-stage latency and allocations.
+Run it from the repository root so config.yml is picked up:
+
+    python3 benchmark.py --actions 20000
+    python3 benchmark.py --input capture.ndjson --json after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import timeit
+import tracemalloc
+
+# bot.py validates its environment at import; the benchmark never talks to Discord
+os.environ.setdefault('DISCORD_TOKEN', 'benchmark')
+os.environ.setdefault('CHANNEL_ID', '1')
+os.environ.setdefault('CONTRACT', 'farmforhoney')
+os.environ.setdefault('NETWORK', 'mainnet')
+
+import bot
+import mock_hyperion
+from hyperion_data import read_recordings
+
+
+# ------------------------------------------------------------------
+# 1.  Payloads
+# ------------------------------------------------------------------
+def synthetic_payloads(count, page_size, seed):
+    """get_actions response bodies (JSON text) holding count generated actions"""
+    random.seed(seed)
+    source = mock_hyperion.ActionSource(bot.CONTRACT)
+    payloads = []
+    for start in range(0, count, page_size):
+        actions = [source.next_action() for _ in range(min(page_size, count - start))]
+        payloads.append(json.dumps({'actions': actions}))
+    return payloads
+
+
+def recorded_payloads(paths, page_size):
+    """Response bodies from captured files
+
+    A .json file holds one get_actions response or a list of them. Any
+    other file is NDJSON, one response or one bare action per line; bare
+    actions are regrouped into pages of page_size.
+    """
+    payloads = []
+    loose_actions = []
+    for item in read_recordings(paths):
+        if 'actions' in item:
+            payloads.append(json.dumps(item))
+        else:
+            loose_actions.append(item)
+    for start in range(0, len(loose_actions), page_size):
+        payloads.append(json.dumps({'actions': loose_actions[start:start + page_size]}))
+    return payloads
+
+
+# ------------------------------------------------------------------
+# 2.  Fake Discord
+# ------------------------------------------------------------------
+class SinkChannel:
+    """Stands in for a discord.TextChannel, counting what would have been posted"""
+
+    def __init__(self, channel_id, send_latency):
+        self.id = channel_id
+        self.name = f"sink-{channel_id}"
+        self.send_latency = send_latency
+        self.messages = 0
+        self.embeds = 0
+
+    async def send(self, content=None, embed=None, embeds=None, **kwargs):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.messages += 1
+        self.embeds += len(embeds or [embed])
+
+
+class StageTimer:
+    """Accumulates wall time spent in one wrapped function"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+
+    def wrap(self, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+                self.calls += 1
+        return timed
+
+
+# ------------------------------------------------------------------
+# 3.  Run
+# ------------------------------------------------------------------
+def source_for(action):
+    """The ingest source an action would have been fetched by, if any"""
+    act = action['act']
+    for source in bot.ingest_sources:
+        if source.account == act['account'] and source.accepts(action):
+            return source
+    return None
+
+
+async def run_benchmark(payloads, args):
+    channels = {}
+
+    def get_channel(channel_id):
+        if channel_id not in channels:
+            channels[channel_id] = SinkChannel(channel_id, args.send_latency)
+        return channels[channel_id]
+
+    bot.bot.get_channel = get_channel
+    # Benchmark actions are not live: no archive or stats writes and no watch DMs
+    bot.live_ingest = False
+    if not args.rate_limit:
+        bot.outbound.rate = 10 ** 9
+    if not args.digests:
+        bot.config['digest'] = {}
+
+    # Time dedup separately from the rest of routing
+    dedup_timer = StageTimer()
+    bot.processed_actions.add = dedup_timer.wrap(bot.processed_actions.add)
+
+    render_before = sum(series[1] for series in bot.embed_render_seconds.values.values())
+    parse_seconds = 0.0
+    route_seconds = 0.0
+    actions_in = 0
+    unrouted = 0
+    replayed = 0
+
+    if args.allocations:
+        tracemalloc.start()
+        snapshot_before = tracemalloc.take_snapshot()
+
+    start = time.perf_counter()
+    for body in payloads:
+        parse_start = time.perf_counter()
+        actions = json.loads(body).get('actions', [])
+        parse_seconds += time.perf_counter() - parse_start
+
+        fetched = ('benchmark', time.time())
+        route_start = time.perf_counter()
+        for action in actions:
+            source = source_for(action)
+            if source is None:
+                unrouted += 1
+                continue
+            action['network'] = source.network
+            await bot.route_action(source, action, fetched)
+            if args.duplicates and random.random() < args.duplicates:
+                # Same action again, as an overlapping page or hedge would deliver it
+                await bot.route_action(source, action, fetched)
+                replayed += 1
+        route_seconds += time.perf_counter() - route_start
+        actions_in += len(actions)
+        # Let the senders run between pages, as they would between polls
+        await asyncio.sleep(0)
+
+    bot.flush_digests()
+    deliver_start = time.perf_counter()
+    await bot.outbound.flush(timeout=args.flush_timeout)
+    deliver_seconds = time.perf_counter() - deliver_start
+    elapsed = time.perf_counter() - start
+
+    allocations = None
+    if args.allocations:
+        snapshot_after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        diff = snapshot_after.compare_to(snapshot_before, 'filename')
+        allocations = {
+            'peak_bytes': peak,
+            'retained_bytes': sum(stat.size_diff for stat in diff),
+            'retained_blocks': sum(stat.count_diff for stat in diff),
+            'top': [
+                {'file': str(stat.traceback[0].filename), 'size_diff': stat.size_diff}
+                for stat in sorted(diff, key=lambda stat: -stat.size_diff)[:5]
+            ]
+        }
+
+    render_seconds = sum(series[1] for series in bot.embed_render_seconds.values.values()) - render_before
+    stages = {
+        stage: bot.latency_tracker.percentiles(stage)
+        for stage in ('digest', 'render', 'queue', 'send')
+    }
+    return {
+        'actions': actions_in,
+        'unrouted': unrouted,
+        'duplicates_fed': replayed,
+        'duplicates_dropped': sum(bot.actions_duplicate.values.values()),
+        'messages': sum(channel.messages for channel in channels.values()),
+        'embeds': sum(channel.embeds for channel in channels.values()),
+        'elapsed_seconds': elapsed,
+        'throughput_actions_per_second': actions_in / elapsed if elapsed else 0.0,
+        'totals_seconds': {
+            'parse': parse_seconds,
+            'dedup': dedup_timer.seconds,
+            'render': render_seconds,
+            'route': route_seconds,
+            'deliver': deliver_seconds
+        },
+        'per_action_us': {
+            stage: seconds / actions_in * 1e6 if actions_in else 0.0
+            for stage, seconds in (
+                ('parse', parse_seconds),
+                ('dedup', dedup_timer.seconds),
+                ('render', render_seconds),
+                ('route', route_seconds)
+            )
+        },
+        'stage_percentiles_seconds': stages,
+        'allocations': allocations
+    }
+
+
+def render_benchmark(payloads, rounds, sample=200):
+    """Microseconds per render_action call for each action type, best of three
+
+    Renders up to ``sample`` actions of each type in a tight loop, so
+    changes to the renderer registry or the embed templates can be measured
+    without the noise of routing and delivery.
+    """
+    by_type = {}
+    for body in payloads:
+        for action in json.loads(body).get('actions', []):
+            group = by_type.setdefault(bot.activity_type(action), [])
+            if len(group) < sample:
+                group.append(action)
+    result = {}
+    for name, group in sorted(by_type.items()):
+        seconds = min(timeit.repeat(lambda: [bot.render_action(action) for action in group], number=rounds, repeat=3))
+        result[name] = seconds / (rounds * len(group)) * 1e6
+    return result
+
+
+# ------------------------------------------------------------------
+# 4.  Report
+# ------------------------------------------------------------------
+def print_report(result, baseline=None):
+    def delta(path):
+        if not baseline:
+            return ''
+        old = baseline
+        new = result
+        for key in path:
+            old = (old or {}).get(key)
+            new = (new or {}).get(key)
+        if not old or new is None:
+            return ''
+        return f"  ({(new - old) / old * 100:+.1f}%)"
+
+    print(f"Actions:     {result['actions']} ({result['unrouted']} matched no subscription)")
+    print(f"Delivered:   {result['embeds']} embeds in {result['messages']} messages")
+    print(f"Duplicates:  {result['duplicates_fed']} fed, {result['duplicates_dropped']} dropped by dedup")
+    print(f"Elapsed:     {result['elapsed_seconds']:.3f}s")
+    print(f"Throughput:  {result['throughput_actions_per_second']:,.0f} actions/s"
+          f"{delta(['throughput_actions_per_second'])}")
+    print("Per action:")
+    for stage, micros in result['per_action_us'].items():
+        print(f"  {stage:<8} {micros:9.2f} µs{delta(['per_action_us', stage])}")
+    print("Pipeline stages (p50 / p95 / p99):")
+    for stage, values in result['stage_percentiles_seconds'].items():
+        if values:
+            print(f"  {stage:<8} " + " / ".join(f"{value * 1000:.3f}ms" for value in values))
+    allocations = result['allocations']
+    if allocations:
+        print(f"Allocations: peak {allocations['peak_bytes'] / 1024:,.0f} KiB{delta(['allocations', 'peak_bytes'])}, "
+              f"retained {allocations['retained_bytes'] / 1024:,.0f} KiB in {allocations['retained_blocks']:,} blocks")
+        for item in allocations['top']:
+            print(f"  {item['size_diff'] / 1024:9,.0f} KiB  {item['file']}")
+    if result.get('render_us_by_type'):
+        print("Render by type (best of 3):")
+        for name, micros in result['render_us_by_type'].items():
+            print(f"  {name:<10} {micros:7.2f} µs{delta(['render_us_by_type', name])}")
+
+
+# ------------------------------------------------------------------
+# 5.  Entry-point
+# ------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--input', nargs='*', default=[], help="Recorded get_actions responses (.json) or NDJSON files")
+    parser.add_argument('--actions', type=int, default=10000, help="Synthetic actions to generate when no --input is given")
+    parser.add_argument('--page-size', type=int, default=100, help="Actions per get_actions payload")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for synthetic payloads and duplicate selection")
+    parser.add_argument('--duplicates', type=float, default=0.0, help="Fraction of actions fed twice to exercise dedup")
+    parser.add_argument('--digests', action='store_true', help="Keep the digest settings from config.yml")
+    parser.add_argument('--rate-limit', action='store_true', help="Keep the outbound per-channel rate limit")
+    parser.add_argument('--send-latency', type=float, default=0.0, help="Seconds each fake channel.send takes")
+    parser.add_argument('--flush-timeout', type=float, default=300.0, help="Longest to wait for the outbound queues to drain")
+    parser.add_argument('--allocations', action='store_true', help="Trace allocations (slows the run down)")
+    parser.add_argument('--render-rounds', type=int, default=0, help="Also time render_action alone, this many rounds per action type")
+    parser.add_argument('--log-level', default='WARNING', help="Level for the bot's own logging during the run")
+    parser.add_argument('--json', help="Write the results to this file")
+    parser.add_argument('--compare', help="Results file from an earlier run to diff against")
+    args = parser.parse_args()
+    logging.getLogger('bot').setLevel(args.log_level.upper())
+
+    if args.input:
+        payloads = recorded_payloads(args.input, args.page_size)
+    else:
+        payloads = synthetic_payloads(args.actions, args.page_size, args.seed)
+    random.seed(args.seed)
+
+    bot.log_listener.start()
+    try:
+        result = asyncio.run(run_benchmark(payloads, args))
+        if args.render_rounds:
+            result['render_us_by_type'] = render_benchmark(payloads, args.render_rounds)
+    finally:
+        bot.log_listener.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,28 @@
 import os
+import sys
 import asyncio
 import json
+import logging
+import logging.handlers
+from queue import SimpleQueue
 import aiohttp
 import discord
 from discord.ext import commands, tasks
 import yaml
+from aiohttp import web
+from action_archive import ActionArchive
+from activity_stats import ActivityStats, PERIODS
+from hyperion_data import parse_chain_time, recorded_actions
 from datetime import datetime, timezone, timedelta
+from collections import deque
+import heapq
+import bisect
+import functools
 import random
+import re
+import string
+import time
+from typing import Literal
 
 # ------------------------------------------------------------------
 # 1.  Environment sanity check
@@ -55,11 +71,10 @@ API_ENDPOINTS = {
         "https://waxtest.api.eosnation.io"
     ]
 }
-HTTP_URLS = API_ENDPOINTS[NETWORK]
 
-# Track last seen transaction to avoid duplicates
-last_seen_timestamp = None
-processed_transactions = set()
+# Contract actions that produce notifications
+CONTRACT_ACTIONS = ['setbeevar', 'sethivevar', 'claim', 'unstake']
+
 bot_start_time = None
 
 # Giveaway storage
@@ -117,6 +132,236 @@ def load_config():
 
 config = load_config()
 
+# Endpoint lists from config.yml replace the built-in ones, e.g. to point
+# the bot at mock_hyperion.py
+for network, urls in (config.get('endpoints', {}).get('urls') or {}).items():
+    API_ENDPOINTS[network.lower()] = list(urls)
+HTTP_URLS = API_ENDPOINTS[NETWORK]
+
+# Logging: the ingest pipeline logs structured events through a queue so
+# the event loop only appends a record; a listener thread formats and
+# writes them. Levels, format and per-event sampling come from config.yml
+class StructuredFormatter(logging.Formatter):
+    """'time level logger event key=value ...' lines, or one JSON object per line"""
+
+    def __init__(self, as_json=False):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record):
+        fields = getattr(record, 'fields', {})
+        timestamp = datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds')
+        if self.as_json:
+            entry = {'time': timestamp, 'level': record.levelname, 'logger': record.name, 'event': record.getMessage()}
+            entry.update(fields)
+            if record.exc_info:
+                entry['exception'] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+        
+        parts = [timestamp, record.levelname, record.name, record.getMessage()]
+        for key, value in fields.items():
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, default=str, separators=(',', ':'))
+            else:
+                value = str(value)
+                if not value or any(char in value for char in ' ="'):
+                    value = json.dumps(value)
+            parts.append(f"{key}={value}")
+        line = ' '.join(parts)
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread"""
+
+    def prepare(self, record):
+        return record
+
+class StructuredLogger:
+    """Logger taking an event name plus key=value fields
+
+    Disabled levels and sampled-out events return before a LogRecord is
+    built, so debug logging in the hot path costs one comparison.
+    """
+
+    def __init__(self, name, sample_every=None):
+        self.logger = logging.getLogger(f"bot.{name}")
+        self.sample_every = sample_every if sample_every is not None else {}  # {event: keep 1 in N}
+        self.seen = {}  # {event: count}
+
+    def log(self, level, event, exc_info=None, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        every = self.sample_every.get(event)
+        if every and every > 1:
+            count = self.seen.get(event, 0)
+            self.seen[event] = count + 1
+            if count % every:
+                return
+            fields['sampled'] = f"1/{every}"
+        self.logger.log(level, event, exc_info=exc_info, extra={'fields': fields})
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(logging.ERROR, event, **fields)
+
+def setup_logging():
+    """Route the bot's loggers through a queue drained by a background thread
+
+    Returns the QueueListener for that thread without starting it. Records
+    wait in the queue until the entry point calls start().
+    """
+    logging_config = config.get('logging', {})
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(StructuredFormatter(as_json=logging_config.get('format', 'text') == 'json'))
+    
+    log_queue = SimpleQueue()
+    root = logging.getLogger('bot')
+    root.setLevel(str(logging_config.get('level', 'INFO')).upper())
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.propagate = False
+    
+    return logging.handlers.QueueListener(log_queue, stream_handler)
+
+log_listener = setup_logging()
+log_sampling = config.get('logging', {}).get('sample_every', {})
+endpoint_log = StructuredLogger('endpoints', log_sampling)
+ingest_log = StructuredLogger('ingest', log_sampling)
+stream_log = StructuredLogger('stream', log_sampling)
+outbound_log = StructuredLogger('outbound', log_sampling)
+
+# Metrics: counters, gauges and histograms are plain dict updates on the
+# hot path and are only formatted (Prometheus text) when scraped
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metric:
+    """A named family of samples keyed by a tuple of label values"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}  # {label_values: value}
+
+    def label_string(self, label_values, extra=()):
+        pairs = list(zip(self.labels, label_values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{label}="{escape_label(value)}"' for label, value in pairs) + '}'
+
+    def sample_lines(self):
+        for label_values, value in self.values.items():
+            yield f"{self.name}{self.label_string(label_values)} {value}"
+
+    def render(self):
+        return '\n'.join([f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}", *self.sample_lines()])
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels=(), collect=None):
+        super().__init__(name, help_text, labels)
+        self.collect = collect  # Called at scrape time, returns {label_values: value}
+
+    def set(self, value, *label_values):
+        self.values[label_values] = value
+
+    def sample_lines(self):
+        if self.collect:
+            try:
+                self.values = self.collect()
+            except Exception as e:
+                print(f"Error collecting {self.name}: {e}")
+        return super().sample_lines()
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            # [per-bucket counts with a final +Inf slot, sum, count]
+            series = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def sample_lines(self):
+        for label_values, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{self.label_string(label_values, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_sum{self.label_string(label_values)} {total}"
+            yield f"{self.name}_count{self.label_string(label_values)} {count}"
+
+class MetricsRegistry:
+    """Every metric the bot exports, in registration order"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=(), collect=None):
+        return self.register(Gauge(name, help_text, labels, collect))
+
+    def histogram(self, name, help_text, labels=(), buckets=Histogram.DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+metrics = MetricsRegistry()
+
+discord_event_seconds = metrics.histogram(
+    'discord_event_handler_seconds', "Time spent in invite and giveaway handlers", ('event', 'outcome'))
+
+def instrumented(event):
+    """Decorator timing a coroutine handler into discord_event_handler_seconds"""
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = await handler(*args, **kwargs)
+                outcome = 'ok'
+                return result
+            finally:
+                discord_event_seconds.observe(time.perf_counter() - start, event, outcome)
+        return wrapper
+    return decorate
+
 # ------------------------------------------------------------------
 # 4.  Discord client
 # ------------------------------------------------------------------
@@ -139,171 +384,231 @@ except Exception as e:
 
 bot = commands.Bot(command_prefix='!', intents=intents)
 
-def create_embed_for_action(action, act_name, act_data, custom_title=None):
-    """Create a nicely formatted Discord embed for blockchain actions"""
-    # Handle different timestamp formats
-    timestamp_str = action.get("@timestamp", action.get("timestamp", ""))
+# Static parts of every embed, computed once
+BLOKS_URLS = {
+    "mainnet": "https://wax.bloks.io",
+    "testnet": "https://wax-test.bloks.io"
+}
+BLOKS_URL = BLOKS_URLS.get(NETWORK, BLOKS_URLS["mainnet"])
+EMBED_FOOTER = "HoneyFarms Contract Activity"
+
+# Embed color by action type
+ACTION_COLORS = {
+    "setbeevar": 0xFFD700,      # Gold
+    "sethivevar": 0xFF8C00,     # Dark Orange
+    "stakehive": 0x32CD32,      # Lime Green
+    "stakebees": 0x228B22,      # Forest Green
+    "claim": 0x4169E1,          # Royal Blue
+    "unstake": 0xFF6347,        # Tomato Red
+    "transfer": 0x32CD32,       # Lime Green (for New Hive Staked)
+}
+DEFAULT_COLOR = 0xffaa00  # Orange
+
+def action_time(action):
+    """Block time of an action, falling back to now if it is missing or malformed"""
     try:
-        if timestamp_str.endswith('Z'):
-            timestamp = datetime.fromisoformat(timestamp_str[:-1]).replace(tzinfo=timezone.utc)
-        elif '+' in timestamp_str:
-            timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        else:
-            timestamp = datetime.fromisoformat(timestamp_str).replace(tzinfo=timezone.utc)
-    except:
-        timestamp = datetime.now(timezone.utc)
-    
+        return parse_chain_time(action.get("@timestamp") or action.get("timestamp", ""))
+    except (ValueError, TypeError, AttributeError):
+        return datetime.now(timezone.utc)
+
+def action_wallet(act_data):
+    """The wallet an action belongs to (sender or owner)"""
+    return act_data.get('from') or act_data.get('owner')
+
+def create_embed_for_action(action, act_name, act_data, custom_title=None):
+    """Create the standard Discord embed for an action: its title and wallet
+
+    Actions with more to show get a renderer spec under `renderers` in config.yml.
+    """
     # Use custom title if provided, otherwise use action name
-    title = custom_title if custom_title else f"{act_name} on {CONTRACT}"
-    
-    # Extract wallet information
-    wallet = None
-    if 'from' in act_data:
-        wallet = act_data['from']
-    elif 'owner' in act_data:
-        wallet = act_data['owner']
-    elif 'to' in act_data and act_data.get('from'):
-        wallet = act_data['from']
-    
-    # Create description with better formatting
-    description_parts = []
-    
-    if wallet:
-        description_parts.append(f"**Wallet:** `{wallet}`")
-    
-    # Only show detailed transaction data for setbeevar actions
-    if act_name == "setbeevar":
-        description_parts.append("")
-        
-        # Format setbeevar data nicely
-        bee_type = act_data.get('type', 'Unknown')
-        rarity = act_data.get('rarity', 'Unknown')
-        category = act_data.get('category', 'Unknown')
-        values = act_data.get('values', [])
-        
-        description_parts.append(f"**Bee Type:** `{bee_type.title()}`")
-        description_parts.append(f"**Rarity:** `{rarity.title()}`")
-        description_parts.append(f"**Category:** `{category.title()}`")
-        
-        if values and len(values) >= 4:
-            description_parts.append("")
-            description_parts.append("**New Earning Values:**")
-            description_parts.append(f"🍯 **HUNY:** `{values[0]}`")
-            description_parts.append(f"🌱 **PLN:** `{values[1]}`")
-            description_parts.append(f"🪙 **BWAX:** `{values[2]}`")
-            description_parts.append(f"👑 **RJ:** `{values[3]}`")
-    elif act_name in ["claim", "unstake"]:
-        # For other actions, show minimal details without JSON
-        if act_name == "claim" and 'hiveitem' in act_data:
-            description_parts.append("")
-            description_parts.append(f"**Hive Item:** `{act_data['hiveitem']}`")
-        elif act_name == "unstake" and 'asset_id' in act_data:
-            description_parts.append("")
-            description_parts.append(f"**Asset ID:** `{act_data['asset_id']}`")
-            if 'hive_id' in act_data:
-                description_parts.append(f"**Hive ID:** `{act_data['hive_id']}`")
-    
-    description = "\n".join(description_parts)
-    
-    # Set color based on action type
-    color_map = {
-        "setbeevar": 0xFFD700,      # Gold
-        "sethivevar": 0xFF8C00,     # Dark Orange
-        "stakehive": 0x32CD32,      # Lime Green
-        "stakebees": 0x228B22,      # Forest Green
-        "claim": 0x4169E1,          # Royal Blue
-        "unstake": 0xFF6347,        # Tomato Red
-        "transfer": 0x32CD32,       # Lime Green (for New Hive Staked)
-    }
+    account = action.get('act', {}).get('account', CONTRACT)
+    if act_name == 'transfer' and act_data.get('to'):
+        # A token transfer belongs to the contract it was sent to, not the token contract
+        account = act_data['to']
+    title = custom_title if custom_title else f"{act_name} on {account}"
     
-    color = color_map.get(act_name, 0xffaa00)  # Default orange
+    wallet = action_wallet(act_data)
+    description = f"**Wallet:** `{wallet}`" if wallet else ""
     
+    return create_custom_embed(action, title, description, ACTION_COLORS.get(act_name, DEFAULT_COLOR))
+
+def create_custom_embed(action, title, description, color):
+    """Create a custom embed with specified title, description and color"""
     embed = discord.Embed(
         title=title,
         description=description,
-        url=f"https://{'wax-test' if NETWORK == 'testnet' else 'wax'}.bloks.io/transaction/{action['trx_id']}",
-        timestamp=timestamp,
+        url=f"{BLOKS_URLS.get(action.get('network'), BLOKS_URL)}/transaction/{action['trx_id']}",
+        timestamp=action_time(action),
         color=color
     )
     
     # Remove transaction hash from footer since it's already linked in the title
-    embed.set_footer(text=f"HoneyFarms Contract Activity")
+    embed.set_footer(text=EMBED_FOOTER)
     return embed
 
-def create_transfer_embed(action, act_data):
-    """Create special embeds for transfer actions with specific memos"""
-    memo = act_data.get('memo', '')
+# Legacy function for backward compatibility
+def embed_for(tx, act_name, data):
+    return create_embed_for_action(tx, act_name, data)
+
+# Embed renderer registry
+# {(account, action): [(compiled memo pattern or None, renderer)]}
+# A renderer is called as renderer(action, act_data, memo_match) and
+# returns a discord.Embed. Entries with a memo pattern are tried in order
+# before the catch-all entry (pattern None).
+EMBED_RENDERERS = {}
+
+class CompiledTemplate:
+    """A str.format-style template split once into static text and field lookups
+
+    Fields may index a list ({values[0]}) and take the 'title' format spec
+    ({type:title}). Missing fields render as 'Unknown' and lists are joined
+    with commas.
+    """
+
+    def __init__(self, template):
+        self.parts = []  # (static text, (field name, list index or None, format spec) or None)
+        for literal, field, spec, _ in string.Formatter().parse(template):
+            lookup = None
+            if field is not None:
+                name, _, index = field.partition('[')
+                lookup = (name, int(index.rstrip(']')) if index else None, spec)
+            self.parts.append((literal, lookup))
+        self.fields = {lookup[0] for _, lookup in self.parts if lookup}
+
+    def render(self, values, missing='Unknown'):
+        """The filled-in template; with missing=None, None if any field is missing"""
+        pieces = []
+        for literal, lookup in self.parts:
+            pieces.append(literal)
+            if lookup is not None:
+                name, index, spec = lookup
+                value = values.get(name)
+                if index is not None:
+                    value = value[index] if isinstance(value, list) and index < len(value) else None
+                elif isinstance(value, list):
+                    value = ', '.join(str(item) for item in value) if value else None
+                if value in (None, ''):
+                    if missing is None:
+                        return None
+                    value = missing
+                value = str(value)
+                pieces.append(value.title() if spec == 'title' else value)
+        return ''.join(pieces)
+
+class SectionedTemplate:
+    """A description made of sections, shown separated by a blank line
+
+    A line is left out when a field it uses is missing, and a section is
+    left out when none of its lines with fields are left, so a heading only
+    shows with something under it.
+    """
+
+    def __init__(self, sections):
+        self.sections = [[CompiledTemplate(line) for line in str(section).split('\n')] for section in sections]
+        self.fields = {field for lines in self.sections for line in lines for field in line.fields}
+
+    def render(self, values):
+        shown = []
+        for lines in self.sections:
+            kept = []
+            filled = not any(line.fields for line in lines)
+            for line in lines:
+                text = line.render(values, missing=None)
+                if text is not None:
+                    kept.append(text)
+                    filled = filled or bool(line.fields)
+            if kept and filled:
+                shown.append('\n'.join(kept))
+        return '\n\n'.join(shown)
+
+def register_renderer(account, act_name, renderer, memo=None):
+    """Add a renderer for (account, action), optionally only for memos matching a regex"""
+    entries = EMBED_RENDERERS.setdefault((account, act_name), [])
+    pattern = re.compile(memo) if memo is not None else None
+    if pattern is None:
+        entries.append((None, renderer))
+    else:
+        # Memo-specific renderers go ahead of the catch-all
+        position = next((i for i, (existing, _) in enumerate(entries) if existing is None), len(entries))
+        entries.insert(position, (pattern, renderer))
+
+def format_action_fields(act_data):
+    """Every action data field as a "**name:** `value`" line, in the order the node sent them (ABI order)"""
+    lines = []
+    for field, value in act_data.items():
+        if isinstance(value, list):
+            value = ', '.join(str(item) for item in value)
+        lines.append(f"**{field}:** `{value if value not in (None, '') else 'Unknown'}`")
+    return "\n".join(lines)
+
+def template_renderer(spec):
+    """Build a renderer from a declarative spec with precompiled title and description
+
+    A spec without a description keeps the standard action embed and only
+    replaces its title. A description given as a list is a SectionedTemplate.
+    """
+    title = CompiledTemplate(spec.get('title', "{action} on {account}"))
+    description = spec.get('description')
+    if isinstance(description, list):
+        description = SectionedTemplate(description)
+    elif description is not None:
+        description = CompiledTemplate(description)
+    color = spec.get('color', ACTION_COLORS.get(spec['action'], DEFAULT_COLOR))
+    wants_fields = 'fields' in title.fields or (description is not None and 'fields' in description.fields)
     
-    if memo == "stakehive":
-        title = "🏠 New Hive Staked"
-        asset_ids = act_data.get('asset_ids', [])
-        
-        # Create a clean description for hive staking
-        description_parts = [
-            f"**Wallet:** `{act_data.get('from', 'Unknown')}`",
-            "",
-            f"**Asset IDs:** `{', '.join(asset_ids) if asset_ids else 'Unknown'}`"
-        ]
-        
-        return create_custom_embed(
-            action, 
-            title, 
-            "\n".join(description_parts),
-            0x32CD32  # Lime Green
-        )
+    def render(action, act_data, match):
+        values = dict(act_data)
+        values['wallet'] = action_wallet(act_data)
+        values['account'] = action['act']['account']
+        values['action'] = action['act']['name']
+        if wants_fields:
+            values['fields'] = format_action_fields(act_data)
+        if match:
+            values.update(match.groupdict())
+        if description is None:
+            return create_embed_for_action(action, spec['action'], act_data, title.render(values))
+        return create_custom_embed(action, title.render(values), description.render(values), color)
+    
+    return render
+
+def load_renderers():
+    """Register the renderers declared in config.yml"""
+    EMBED_RENDERERS.clear()
     
-    elif memo.startswith("stakebees:"):
-        title = "🐝 Bees Staked to Hive"
+    for spec in config.get('renderers') or []:
         try:
-            hive_id = memo.split(":")[1]
-            asset_ids = act_data.get('asset_ids', [])
-            
-            description_parts = [
-                f"**Wallet:** `{act_data.get('from', 'Unknown')}`",
-                "",
-                f"**Hive ID:** `{hive_id}`",
-                f"**Bee Asset IDs:** `{', '.join(asset_ids) if asset_ids else 'Unknown'}`"
-            ]
-            
-            return create_custom_embed(
-                action,
-                title,
-                "\n".join(description_parts),
-                0x228B22  # Forest Green
-            )
-        except (ValueError, IndexError):
-            return None
+            register_renderer(spec.get('account', CONTRACT), spec['action'], template_renderer(spec), spec.get('memo'))
+        except (KeyError, re.error) as e:
+            print(f"Skipping invalid renderer {spec}: {e}")
     
-    return None
+    # Transfers without a recognised memo get the generic transfer embed
+    for account, act_name in (('atomicassets', 'logtransfer'), (CONTRACT, 'transfer')):
+        register_renderer(account, act_name, lambda action, act_data, match: create_embed_for_action(action, 'transfer', act_data))
 
-def create_custom_embed(action, title, description, color):
-    """Create a custom embed with specified title, description and color"""
-    timestamp_str = action.get("@timestamp", action.get("timestamp", ""))
+embed_render_seconds = metrics.histogram(
+    'embed_render_seconds', "Time to build one action's embed", ('action',),
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005))
+
+def render_action(action):
+    """Build the Discord embed for one action through the renderer registry"""
+    start = time.perf_counter()
+    act = action['act']
+    act_data = act['data']
     try:
-        if timestamp_str.endswith('Z'):
-            timestamp = datetime.fromisoformat(timestamp_str[:-1]).replace(tzinfo=timezone.utc)
-        elif '+' in timestamp_str:
-            timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        else:
-            timestamp = datetime.fromisoformat(timestamp_str).replace(tzinfo=timezone.utc)
-    except:
-        timestamp = datetime.now(timezone.utc)
-    
-    embed = discord.Embed(
-        title=title,
-        description=description,
-        url=f"https://{'wax-test' if NETWORK == 'testnet' else 'wax'}.bloks.io/transaction/{action['trx_id']}",
-        timestamp=timestamp,
-        color=color
-    )
-    
-    # Remove transaction hash from footer since it's already linked in the title
-    embed.set_footer(text=f"HoneyFarms Contract Activity")
-    return embed
+        entries = EMBED_RENDERERS.get((act['account'], act['name']))
+        if entries:
+            memo = act_data.get('memo', '')
+            for pattern, renderer in entries:
+                if pattern is None:
+                    return renderer(action, act_data, None)
+                match = pattern.match(memo)
+                if match:
+                    return renderer(action, act_data, match)
+        return create_embed_for_action(action, act['name'], act_data)
+    finally:
+        embed_render_seconds.observe(time.perf_counter() - start, act['name'])
 
-# Legacy function for backward compatibility
-def embed_for(tx, act_name, data):
-    return create_embed_for_action(tx, act_name, data)
+load_renderers()
 
 # ------------------------------------------------------------------
 # 5.  Discord slash commands
@@ -755,6 +1060,185 @@ async def reset_invites_command(
     except Exception as e:
         print(f"Error in reset_invites command: {e}")
         await interaction.followup.send("❌ An error occurred while resetting invite statistics.", ephemeral=True)
+
+@bot.tree.command(
+    name="latency",
+    description="Show chain-to-Discord latency per pipeline stage and endpoint (Admin only)"
+)
+async def latency_command(interaction: discord.Interaction):
+    """Slash command to show rolling notification latency percentiles"""
+    try:
+        await interaction.response.defer(ephemeral=True)
+        
+        # Check if user has the required role
+        required_role_id = config.get('permissions', {}).get('monitoring_role_id')
+        
+        if not required_role_id or required_role_id == "YOUR_ROLE_ID_HERE":
+            await interaction.followup.send("❌ Latency command is not configured. Please set the monitoring_role_id in config.yml", ephemeral=True)
+            return
+        
+        # Check if user has the required role
+        user_role_ids = [str(role.id) for role in interaction.user.roles]
+        if required_role_id not in user_role_ids:
+            await interaction.followup.send("❌ You don't have permission to use this command.", ephemeral=True)
+            return
+        
+        def format_percentiles(values):
+            return " / ".join(f"{value:.2f}s" if value >= 1 else f"{value * 1000:.0f}ms" for value in values)
+        
+        embed = discord.Embed(
+            title="⏱️ Notification Latency",
+            description=f"p50 / p95 / p99 over the last {latency_tracker.window} notifications",
+            color=DEFAULT_COLOR
+        )
+        
+        stage_lines = []
+        for stage in LatencyTracker.STAGES:
+            values = latency_tracker.percentiles(stage)
+            if values:
+                stage_lines.append(f"**{stage}:** {format_percentiles(values)}")
+        embed.add_field(name="By Stage", value="\n".join(stage_lines) or "No notifications sent yet", inline=False)
+        
+        endpoint_lines = []
+        for endpoint in latency_tracker.endpoints():
+            values = latency_tracker.percentiles('total', endpoint)
+            if values:
+                endpoint_lines.append(f"`{endpoint}`: {format_percentiles(values)}")
+        if endpoint_lines:
+            embed.add_field(name="Total by Endpoint", value="\n".join(endpoint_lines)[:1024], inline=False)
+        
+        await interaction.followup.send(embed=embed, ephemeral=True)
+        
+    except Exception as e:
+        print(f"Error in latency command: {e}")
+        await interaction.followup.send("❌ An error occurred while collecting latency statistics.", ephemeral=True)
+
+@bot.tree.command(
+    name="stats",
+    description="Show action counts over time and the most active wallets"
+)
+async def stats_command(
+    interaction: discord.Interaction,
+    action: str = None,
+    period: Literal['hour', 'day', 'week', 'month'] = 'day',
+    wallet: str = None
+):
+    """Slash command to show activity rollups for one or all tracked action types"""
+    try:
+        await interaction.response.defer()
+        
+        if not activity_stats:
+            await interaction.followup.send("❌ Activity stats are not available. They are disabled in config.yml or the bot is replaying recorded actions.", ephemeral=True)
+            return
+        
+        if action and action not in STATS_ACTIONS:
+            await interaction.followup.send(f"❌ Unknown action. Tracked actions: {', '.join(STATS_ACTIONS)}", ephemeral=True)
+            return
+        
+        started = time.perf_counter()
+        actions = [action] if action else STATS_ACTIONS
+        
+        def query():
+            activity_stats.flush()
+            series = activity_stats.series(NETWORK, actions, period, wallet)
+            top = [] if wallet else activity_stats.top_wallets(NETWORK, actions, period, limit=5)
+            return series, top
+        
+        series, top = await asyncio.to_thread(query)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        counts = [count for _, count in series]
+        total = sum(counts)
+        peak = max(counts)
+        resolution = PERIODS[period][1]
+        
+        # One bar per bucket, scaled to the busiest bucket
+        bars = "▁▂▃▄▅▆▇█"
+        sparkline = "".join(bars[min(len(bars) - 1, count * len(bars) // (peak + 1))] if count else " " for count in counts)
+        
+        embed = discord.Embed(
+            title=f"📈 {action or 'All tracked actions'}" + (f" by {wallet}" if wallet else ""),
+            description=f"**{total:,}** in the last {period} on {NETWORK}",
+            color=ACTION_COLORS.get(action, DEFAULT_COLOR)
+        )
+        
+        peak_bucket = series[counts.index(peak)][0]
+        peak_time = datetime.fromtimestamp(peak_bucket, timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
+        embed.add_field(
+            name=f"Per {resolution}",
+            value=f"`{sparkline}`\nPeak: **{peak:,}** at {peak_time}" if total else "No activity",
+            inline=False
+        )
+        
+        if top:
+            embed.add_field(
+                name="Top Wallets",
+                value="\n".join(f"{i + 1}. `{name}` - {count:,}" for i, (name, count) in enumerate(top)),
+                inline=False
+            )
+        
+        embed.set_footer(text=f"{EMBED_FOOTER} • Answered from rollups in {elapsed_ms:.0f}ms")
+        
+        await interaction.followup.send(embed=embed)
+        
+    except Exception as e:
+        print(f"Error in stats command: {e}")
+        await interaction.followup.send("❌ An error occurred while collecting activity statistics.", ephemeral=True)
+
+@bot.tree.command(
+    name="watch",
+    description="Get a DM when a wallet claims, unstakes or stakes"
+)
+async def watch_command(interaction: discord.Interaction, wallet: str):
+    """Slash command to watch a wallet"""
+    try:
+        await interaction.response.defer(ephemeral=True)
+        
+        if not watch_config.get('enabled', True):
+            await interaction.followup.send("❌ Wallet watching is disabled. Enable watch in config.yml", ephemeral=True)
+            return
+        
+        wallet = wallet.strip().lower()
+        if not WAX_ACCOUNT.match(wallet):
+            await interaction.followup.send("❌ That doesn't look like a WAX wallet (1-12 characters: a-z, 1-5 and dots).", ephemeral=True)
+            return
+        
+        if not watchlist.add(interaction.user.id, wallet):
+            await interaction.followup.send(
+                f"❌ You can watch up to {watchlist.max_per_user} wallets. Use /unwatch to remove one first.", ephemeral=True)
+            return
+        
+        watched = ", ".join(f"`{name}`" for name in sorted(watchlist.watched[interaction.user.id]))
+        await interaction.followup.send(
+            f"✅ Watching `{wallet}`. You'll get a DM for its {', '.join(WATCH_ACTIONS)} actions "
+            f"(make sure DMs from server members are allowed).\nWatching: {watched}",
+            ephemeral=True
+        )
+        
+    except Exception as e:
+        print(f"Error in watch command: {e}")
+        await interaction.followup.send("❌ An error occurred while adding the watch.", ephemeral=True)
+
+@bot.tree.command(
+    name="unwatch",
+    description="Stop DMs for a wallet, or for all your watched wallets"
+)
+async def unwatch_command(interaction: discord.Interaction, wallet: str = None):
+    """Slash command to stop watching one or all wallets"""
+    try:
+        await interaction.response.defer(ephemeral=True)
+        
+        removed = watchlist.remove(interaction.user.id, wallet.strip().lower() if wallet else None)
+        if not removed:
+            await interaction.followup.send(
+                f"📭 You weren't watching `{wallet}`." if wallet else "📭 You aren't watching any wallets.", ephemeral=True)
+            return
+        
+        await interaction.followup.send(f"✅ Stopped watching {', '.join(f'`{name}`' for name in removed)}.", ephemeral=True)
+        
+    except Exception as e:
+        print(f"Error in unwatch command: {e}")
+        await interaction.followup.send("❌ An error occurred while removing the watch.", ephemeral=True)
   
   # ------------------------------------------------------------------
   # 6.  Invite tracking functions
@@ -824,6 +1308,7 @@ async def find_invite_used(guild, member):
   # ------------------------------------------------------------------
 
 @bot.event
+@instrumented('reaction_add')
 async def on_reaction_add(reaction, user):
     """Handle reaction additions for giveaways"""
     # Ignore bot reactions
@@ -859,6 +1344,7 @@ async def on_reaction_add(reaction, user):
             await update_giveaway_embed(reaction.message, giveaway)
 
 @bot.event
+@instrumented('member_join')
 async def on_member_join(member):
     """Handle member joins and track invite usage"""
     try:
@@ -927,6 +1413,7 @@ async def on_member_join(member):
         print(f"Error in on_member_join: {e}")
 
 @bot.event
+@instrumented('member_remove')
 async def on_member_remove(member):
     """Handle member leaves and update invite statistics"""
     try:
@@ -967,6 +1454,7 @@ async def on_member_remove(member):
         print(f"Error in on_member_remove: {e}")
 
 @bot.event
+@instrumented('invite_create')
 async def on_invite_create(invite):
     """Handle new invite creation"""
     try:
@@ -977,6 +1465,7 @@ async def on_invite_create(invite):
         print(f"Error in on_invite_create: {e}")
 
 @bot.event
+@instrumented('invite_delete')
 async def on_invite_delete(invite):
     """Handle invite deletion"""
     try:
@@ -986,6 +1475,7 @@ async def on_invite_delete(invite):
         print(f"Error in on_invite_delete: {e}")
 
 @bot.event
+@instrumented('reaction_remove')
 async def on_reaction_remove(reaction, user):
     """Handle reaction removals for giveaways"""
     # Ignore bot reactions
@@ -1023,6 +1513,7 @@ async def update_giveaway_embed(message, giveaway):
     except Exception as e:
         print(f"Error updating giveaway embed: {e}")
 
+@instrumented('end_giveaway')
 async def end_giveaway(message_id):
     """End a giveaway and pick a winner"""
     if message_id not in active_giveaways:
@@ -1104,190 +1595,2020 @@ async def save_invite_data_periodic():
     """Save invite data every 5 minutes"""
     save_invite_data()
 
+@tasks.loop(minutes=5)
+async def report_outbound_stats():
+    """Log notification queue depth and send latency every 5 minutes"""
+    if outbound.messages_sent or outbound.queue_depth():
+        outbound_log.info("outbound_stats", **outbound.summary())
+
+@tasks.loop(seconds=5)
+async def checkpoint_deliveries():
+    """Save the checkpoint once queued notifications have gone out, so it catches up after a burst"""
+    if delivery_ledger.settled:
+        await save_checkpoint()
+
+@tasks.loop(minutes=5)
+async def report_endpoint_state():
+    """Log any endpoint that is not in rotation every 5 minutes"""
+    for network, scheduler in endpoint_schedulers.items():
+        for api_url, circuit in scheduler.circuit_states().items():
+            stale = not scheduler.stats[api_url]['eligible']
+            if circuit['state'] != 'closed' or stale:
+                endpoint_log.warning("endpoint_out_of_rotation", network=network, endpoint=api_url,
+                                     circuit=circuit['state'], trips=circuit['trips'], stale=stale)
+
 # ------------------------------------------------------------------
 # 7.  HTTP polling listener
 # ------------------------------------------------------------------
-async def http_listener():
-    global last_seen_timestamp, processed_transactions, bot_start_time
-    
-    await bot.wait_until_ready()
-    channel = bot.get_channel(CID)
-    
-    # Set bot start time to prevent processing old actions
-    bot_start_time = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-    print(f"Bot started at: {bot_start_time}")
-    
-    # Wait 10 seconds after startup to avoid processing old actions
-    print("Waiting 10 seconds to avoid processing old actions...")
-    await asyncio.sleep(10)
-    print("Starting to monitor for new actions...")
-    
-    current_url_index = 0
-    consecutive_failures = 0
-    
-    while True:
-        api_url = HTTP_URLS[current_url_index]
-        
+# One long-lived session per Hyperion endpoint so polls reuse pooled
+# keep-alive connections instead of paying a TCP+TLS handshake each time
+http_sessions = {}  # {api_url: aiohttp.ClientSession}
+
+def get_http_session(api_url):
+    """Return the shared session for an endpoint, creating it on first use"""
+    session = http_sessions.get(api_url)
+    if session is None or session.closed:
+        http_config = config.get('http', {})
+        connector = aiohttp.TCPConnector(
+            limit_per_host=http_config.get('connections_per_host', 4),
+            ttl_dns_cache=http_config.get('dns_cache_seconds', 300),
+            keepalive_timeout=http_config.get('keepalive_seconds', 60),
+            enable_cleanup_closed=True
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=http_config.get('total_timeout_seconds', 30),
+            connect=http_config.get('connect_timeout_seconds', 5)
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        http_sessions[api_url] = session
+    return session
+
+async def close_http_sessions():
+    """Close every pooled Hyperion session"""
+    for api_url, session in list(http_sessions.items()):
         try:
-            async with aiohttp.ClientSession() as session:
-                # Query for farmforhoney contract actions
-                params = {
-                    'account': CONTRACT,
-                    'action': 'setbeevar,sethivevar,claim,unstake',
-                    'limit': 20,
-                    'sort': 'desc'
-                }
-                
-                if last_seen_timestamp:
-                    params['after'] = last_seen_timestamp
-                
-                print(f"Polling {api_url}/v2/history/get_actions...")
-                
-                async with session.get(f"{api_url}/v2/history/get_actions", params=params, timeout=30) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        actions = data.get('actions', [])
-                        
-                        print(f"Found {len(actions)} actions from {api_url}")
-                        
-                        # Process actions in chronological order (reverse since we got desc)
-                        for action in reversed(actions):
-                            trx_id = action['trx_id']
-                            
-                            # Skip if we've already processed this transaction
-                            if trx_id in processed_transactions:
-                                continue
-                            
-                            # Skip actions that occurred before bot started
-                            action_timestamp = action.get('@timestamp', action.get('timestamp', ''))
-                            if bot_start_time and action_timestamp < bot_start_time:
-                                continue
-                                
-                            processed_transactions.add(trx_id)
-                            
-                            # Keep only recent transactions in memory (last 1000)
-                            if len(processed_transactions) > 1000:
-                                processed_transactions = set(list(processed_transactions)[-500:])
-                            
-                            act = action['act']
-                            act_name = act['name']
-                            act_data = act['data']
-                            
-                            print(f"Processing {act_name} action: {act_data}")
-                            
-                            try:
-                                # Create appropriate embed based on action type
-                                if act_name == 'claim':
-                                    embed = create_embed_for_action(action, act_name, act_data, "💰 Honey Claimed")
-                                elif act_name == 'unstake':
-                                    embed = create_embed_for_action(action, act_name, act_data, "📤 Asset Unstaked")
-                                elif act_name == 'transfer':
-                                    # Try to create special transfer embed first
-                                    embed = create_transfer_embed(action, act_data)
-                                    if not embed:
-                                        # Fallback to generic transfer embed
-                                        embed = create_embed_for_action(action, act_name, act_data)
-                                else:
-                                    embed = create_embed_for_action(action, act_name, act_data)
-                                
-                                await channel.send(embed=embed)
-                                print(f"Sent {act_name} notification to Discord")
-                            except Exception as e:
-                                print(f"Error sending Discord message: {e}")
-                        
-                        # Update last seen timestamp
-                        if actions:
-                            last_seen_timestamp = actions[0]['@timestamp']
-                        
-                        # Also check for atomicassets logtransfer actions
-                        await check_logtransfer_actions(session, api_url, channel)
-                        
-                        # Reset failure counter and URL index on success
-                        consecutive_failures = 0
-                        current_url_index = 0
-                        
-                    else:
-                        print(f"HTTP {response.status} from {api_url}")
-                        raise aiohttp.ClientError(f"HTTP {response.status}")
-                        
+            await session.close()
         except Exception as e:
-            print(f"Error polling {api_url}: {e}")
-            consecutive_failures += 1
-            
-            # Try next URL
-            current_url_index = (current_url_index + 1) % len(HTTP_URLS)
-            
-            # If we've tried all URLs multiple times, enter test mode
-            if consecutive_failures >= len(HTTP_URLS) * 2:
-                print("All HTTP endpoints failed multiple times. Entering test mode...")
-                await test_mode_simulation(channel)
-                return
-        
-        # Wait before next poll
-        await asyncio.sleep(POLL_INTERVAL)
+            endpoint_log.warning("session_close_failed", endpoint=api_url, error=e)
+    http_sessions.clear()
 
-async def check_logtransfer_actions(session, api_url, channel):
-    """Check for atomicassets logtransfer actions to farmforhoney"""
-    global last_seen_timestamp
-    try:
-        params = {
-            'account': 'atomicassets',
-            'action': 'logtransfer',
-            'limit': 10,
-            'sort': 'desc'
+async def fetch_actions(api_url, params):
+    """Query /v2/history/get_actions on an endpoint and return the decoded response"""
+    session = get_http_session(api_url)
+    async with session.get(f"{api_url}/v2/history/get_actions", params=params) as response:
+        if response.status != 200:
+            endpoint_log.warning("http_error", endpoint=api_url, status=response.status)
+            raise aiohttp.ClientError(f"HTTP {response.status}")
+        return await response.json()
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one endpoint
+
+    ``threshold`` consecutive failures open the circuit for a jittered,
+    exponentially growing back-off. When it expires the circuit goes
+    half-open and a single cheap probe decides whether it closes again.
+    """
+
+    def __init__(self, threshold=3, open_seconds=5.0, max_open_seconds=300.0):
+        self.threshold = threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.delay = open_seconds
+        self.retry_at = 0.0
+        self.trips = 0
+
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+        self.delay = self.open_seconds
+
+    def record_failure(self):
+        if self.state == 'open':
+            # A request already in flight when the circuit opened; it says nothing new
+            return
+        self.failures += 1
+        if self.state == 'half-open':
+            # The probe failed, so the endpoint gets a longer back-off
+            self.delay = min(self.max_open_seconds, self.delay * 2)
+            self.trip()
+        elif self.failures >= self.threshold:
+            self.trip()
+
+    def trip(self):
+        """Open the circuit for the current back-off, with jitter"""
+        self.state = 'open'
+        self.trips += 1
+        self.retry_at = time.monotonic() + self.delay * random.uniform(0.5, 1.5)
+
+    def due(self, now):
+        """Whether an open circuit's back-off has expired and it may be probed"""
+        return self.state == 'open' and now >= self.retry_at
+
+class EndpointScheduler:
+    """Rank Hyperion endpoints by rolling latency and error rate"""
+
+    def __init__(self, urls, window=50, error_penalty=5.0, probe_interval=60.0, breaker_settings=None):
+        self.urls = list(urls)
+        self.breakers = {url: CircuitBreaker(**(breaker_settings or {})) for url in self.urls}
+        self.error_penalty = error_penalty  # Seconds of latency one failure is worth
+        self.probe_interval = probe_interval  # Re-measure idle endpoints this often
+        self.stats = {
+            url: {
+                'latencies': deque(maxlen=window),
+                'latency_ewma': None,
+                'error_ewma': 0.0,
+                'last_used': 0.0,
+                'head_lag': None,
+                'requests': 0,
+                'failures': 0,
+                # Filled in by the health prober
+                'eligible': True,
+                'head_block_lag': None,
+                'index_lag': None,
+                'health_lag': None,  # head_block_lag + index_lag, None unless the last probe was OK
+                'health_latency': None
+            }
+            for url in self.urls
         }
-        
-        # Only get transfers after the last seen timestamp to avoid spam on startup
-        if last_seen_timestamp:
-            params['after'] = last_seen_timestamp
-        
-        async with session.get(f"{api_url}/v2/history/get_actions", params=params, timeout=30) as response:
-            if response.status == 200:
-                data = await response.json()
-                actions = data.get('actions', [])
-                
-                for action in actions:
-                    trx_id = action['trx_id']
-                    
-                    # Skip if already processed
-                    if trx_id in processed_transactions:
-                        continue
-                    
-                    # Skip actions that occurred before bot started
-                    action_timestamp = action.get('@timestamp', action.get('timestamp', ''))
-                    if bot_start_time and action_timestamp < bot_start_time:
-                        continue
-                    
-                    act_data = action['act']['data']
-                    
-                    # Only process transfers to our contract
-                    if act_data.get('to') != CONTRACT:
-                        continue
-                    
-                    processed_transactions.add(trx_id)
-                    
-                    # Create special embed for transfer actions
-                    embed = create_transfer_embed(action, act_data)
-                    if embed:
-                        await channel.send(embed=embed)
-                        memo = act_data.get('memo', '')
-                        if memo == "stakehive":
-                            print(f"Sent 'New Hive Staked' notification to Discord")
-                        elif memo.startswith("stakebees:"):
-                            print(f"Sent 'Bees Staked to Hive' notification to Discord")
-                    else:
-                        # Create a generic transfer embed as fallback
-                        generic_embed = create_embed_for_action(action, "transfer", act_data)
-                        await channel.send(embed=generic_embed)
-                        print(f"Sent generic transfer notification to Discord")
-                            
-    except Exception as e:
-        print(f"Error checking logtransfer actions: {e}")
 
-# ------------------------------------------------------------------
-# 8.  Entry-point
-# ------------------------------------------------------------------
-@bot.event
+    def record_success(self, url, latency):
+        stats = self.stats[url]
+        self.record_latency(url, latency)
+        stats['error_ewma'] *= 0.8
+        stats['requests'] += 1
+        breaker = self.breakers[url]
+        if breaker.state != 'closed':
+            endpoint_log.info("circuit_closed", endpoint=url)
+        breaker.record_success()
+
+    def record_failure(self, url):
+        stats = self.stats[url]
+        stats['error_ewma'] = stats['error_ewma'] * 0.8 + 0.2
+        stats['requests'] += 1
+        stats['failures'] += 1
+        breaker = self.breakers[url]
+        was_open = breaker.state == 'open'
+        breaker.record_failure()
+        if breaker.state == 'open' and not was_open:
+            endpoint_log.warning("circuit_open", endpoint=url, retry_in=round(breaker.retry_at - time.monotonic(), 1))
+
+    def record_latency(self, url, latency):
+        """Add a latency sample without touching the error score"""
+        stats = self.stats[url]
+        stats['latencies'].append(latency)
+        if stats['latency_ewma'] is None:
+            stats['latency_ewma'] = latency
+        else:
+            stats['latency_ewma'] = stats['latency_ewma'] * 0.8 + latency * 0.2
+
+    def record_latency_floor(self, url, elapsed):
+        """Note that a request was cancelled unanswered after ``elapsed`` seconds
+
+        The real latency is at least that long, so this can only raise the
+        estimate. An early cancel must never make a slow node look fast.
+        """
+        estimate = self.stats[url]['latency_ewma']
+        if estimate is None or elapsed > estimate:
+            self.record_latency(url, elapsed)
+
+    def record_head(self, url, data):
+        """Remember how far the endpoint's index trails the chain, when it says"""
+        indexed_time = data.get('last_indexed_block_time')
+        if not indexed_time:
+            return
+        try:
+            lag = datetime.now(timezone.utc) - parse_chain_time(indexed_time)
+        except ValueError:
+            return
+        self.stats[url]['head_lag'] = max(0.0, lag.total_seconds())
+
+    def record_health(self, url, health, latency, max_head_lag, max_index_lag):
+        """Store a /v2/health reply and decide whether the endpoint is fresh enough to poll
+
+        Returns the reason the endpoint is stale, or None if it is eligible.
+        """
+        stats = self.stats[url]
+        self.clear_health(url)
+        stats['health_latency'] = latency
+        services = {service.get('service'): service for service in health.get('health', [])}
+        
+        reason = None
+        nodeos = services.get('NodeosRPC', {})
+        head_block_time = nodeos.get('service_data', {}).get('head_block_time')
+        if nodeos.get('status') not in (None, 'OK'):
+            reason = f"NodeosRPC {nodeos.get('status')}"
+        elif head_block_time:
+            lag = datetime.now(timezone.utc) - parse_chain_time(head_block_time)
+            stats['head_block_lag'] = max(0.0, lag.total_seconds())
+            if stats['head_block_lag'] > max_head_lag:
+                reason = f"head block {stats['head_block_lag']:.0f}s behind"
+        
+        elastic = services.get('Elasticsearch', {})
+        head_offset = elastic.get('service_data', {}).get('head_offset')
+        if elastic.get('status') not in (None, 'OK'):
+            reason = reason or f"Elasticsearch {elastic.get('status')}"
+        elif head_offset is not None:
+            # head_offset counts blocks the index trails the node by, at 0.5s a block
+            stats['index_lag'] = max(0.0, float(head_offset) * 0.5)
+            if stats['index_lag'] > max_index_lag:
+                reason = reason or f"indexer {stats['index_lag']:.0f}s behind"
+        
+        if reason is None and stats['head_block_lag'] is not None and stats['index_lag'] is not None:
+            stats['health_lag'] = stats['head_block_lag'] + stats['index_lag']
+        self.set_eligible(url, reason)
+        return reason
+
+    def clear_health(self, url):
+        """Forget the last probe's lag figures, so a failed or degraded probe leaves none behind"""
+        stats = self.stats[url]
+        stats['head_block_lag'] = None
+        stats['index_lag'] = None
+        stats['health_lag'] = None
+
+    def set_eligible(self, url, reason):
+        """Take an endpoint out of rotation (with a reason) or put it back (reason None)"""
+        stats = self.stats[url]
+        eligible = reason is None
+        if stats['eligible'] != eligible:
+            if eligible:
+                endpoint_log.info("endpoint_fresh", endpoint=url)
+            else:
+                endpoint_log.warning("endpoint_stale", endpoint=url, reason=reason)
+        stats['eligible'] = eligible
+
+    def eligible(self):
+        """Closed-circuit endpoints the health prober considers fresh, else any closed-circuit endpoint"""
+        closed = [url for url in self.urls if self.breakers[url].state == 'closed']
+        return [url for url in closed if self.stats[url]['eligible']] or closed
+
+    def available(self):
+        """Whether any endpoint's circuit is closed"""
+        return any(breaker.state == 'closed' for breaker in self.breakers.values())
+
+    def due_for_probe(self):
+        """Open circuits whose back-off has expired, now switched to half-open"""
+        now = time.monotonic()
+        due = [url for url in self.urls if self.breakers[url].due(now)]
+        for url in due:
+            self.breakers[url].state = 'half-open'
+        return due
+
+    def next_retry(self):
+        """Monotonic time the earliest open circuit may be probed, or None if none are open"""
+        retries = [breaker.retry_at for breaker in self.breakers.values() if breaker.state == 'open']
+        return min(retries) if retries else None
+
+    def circuit_states(self):
+        """{url: {'state', 'failures', 'trips', 'retry_in'}} for monitoring"""
+        now = time.monotonic()
+        return {
+            url: {
+                'state': breaker.state,
+                'failures': breaker.failures,
+                'trips': breaker.trips,
+                'retry_in': max(0.0, breaker.retry_at - now) if breaker.state == 'open' else None
+            }
+            for url, breaker in self.breakers.items()
+        }
+
+    def head_lag(self):
+        """Smallest head lag across eligible endpoints, or None if none reported one
+
+        Uses the lag get_actions reported, falling back to the health probe's.
+        """
+        lags = []
+        for url in self.eligible():
+            stats = self.stats[url]
+            lag = stats['head_lag'] if stats['head_lag'] is not None else stats['health_lag']
+            if lag is not None:
+                lags.append(lag)
+        return min(lags) if lags else None
+
+    def score(self, url):
+        """Lower is better; endpoints without samples score 0 so they get measured"""
+        stats = self.stats[url]
+        latency = stats['latency_ewma'] or 0.0
+        return latency + stats['error_ewma'] * self.error_penalty
+
+    def ranked(self):
+        """Eligible endpoints ordered best first, with any long-idle endpoint promoted for re-measuring"""
+        now = time.monotonic()
+        ranked = sorted(self.eligible(), key=self.score)
+        stale = [url for url in ranked[1:] if now - self.stats[url]['last_used'] > self.probe_interval]
+        if stale:
+            ranked.remove(stale[0])
+            ranked.insert(0, stale[0])
+        return ranked
+
+    def mark_used(self, url):
+        self.stats[url]['last_used'] = time.monotonic()
+
+    def p95(self, url):
+        latencies = self.stats[url]['latencies']
+        if not latencies:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def hedge_delay(self, url, minimum):
+        """How long to wait on an endpoint before hedging to the runner-up"""
+        p95 = self.p95(url)
+        if p95 is None:
+            return None
+        return max(minimum, p95)
+
+endpoint_config = config.get('endpoints', {})
+endpoint_schedulers = {
+    network: EndpointScheduler(
+        urls,
+        window=endpoint_config.get('latency_window', 50),
+        error_penalty=endpoint_config.get('error_penalty_seconds', 5.0),
+        probe_interval=endpoint_config.get('probe_interval_seconds', 60),
+        breaker_settings={
+            'threshold': endpoint_config.get('circuit_failure_threshold', 3),
+            'open_seconds': endpoint_config.get('circuit_open_seconds', 5),
+            'max_open_seconds': endpoint_config.get('circuit_max_open_seconds', 300)
+        }
+    )
+    for network, urls in API_ENDPOINTS.items()
+}
+
+CIRCUIT_STATE_VALUES = {'closed': 0, 'half-open': 1, 'open': 2}
+
+def collect_endpoint_stats(field):
+    """{(network, endpoint): value} of one scheduler stats field, for scrape-time gauges"""
+    return {
+        (network, api_url): stats[field]
+        for network, scheduler in endpoint_schedulers.items()
+        for api_url, stats in scheduler.stats.items()
+        if stats[field] is not None
+    }
+
+metrics.gauge(
+    'endpoint_circuit_state', "Circuit breaker state (0 closed, 1 half-open, 2 open)", ('network', 'endpoint'),
+    collect=lambda: {
+        (network, api_url): CIRCUIT_STATE_VALUES[breaker.state]
+        for network, scheduler in endpoint_schedulers.items()
+        for api_url, breaker in scheduler.breakers.items()
+    })
+metrics.gauge(
+    'endpoint_eligible', "1 if the health prober considers the endpoint fresh", ('network', 'endpoint'),
+    collect=lambda: {key: int(value) for key, value in collect_endpoint_stats('eligible').items()})
+metrics.gauge(
+    'endpoint_head_lag_seconds', "How far the endpoint's index trails the chain", ('network', 'endpoint'),
+    collect=lambda: collect_endpoint_stats('head_lag'))
+metrics.gauge(
+    'endpoint_health_lag_seconds', "Head block plus index lag from the last OK health probe", ('network', 'endpoint'),
+    collect=lambda: collect_endpoint_stats('health_lag'))
+
+# Health prober: polls each node's /v2/health in the background so lagging
+# nodes are dropped from rotation before a poll lands on them
+health_config = config.get('health', {})
+health_task = None
+
+async def probe_endpoint(scheduler, api_url):
+    """Query one endpoint's /v2/health and update its eligibility"""
+    session = get_http_session(api_url)
+    timeout = aiohttp.ClientTimeout(total=health_config.get('timeout_seconds', 5))
+    start = time.perf_counter()
+    try:
+        async with session.get(f"{api_url}/v2/health", timeout=timeout) as response:
+            if response.status != 200:
+                raise aiohttp.ClientError(f"HTTP {response.status}")
+            health = await response.json()
+        scheduler.record_health(
+            api_url,
+            health,
+            time.perf_counter() - start,
+            health_config.get('max_head_lag_seconds', 10),
+            health_config.get('max_index_lag_seconds', 10)
+        )
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        scheduler.clear_health(api_url)
+        scheduler.set_eligible(api_url, f"health check failed ({type(e).__name__})")
+
+async def health_prober():
+    """Probe every endpoint of every network in use, forever"""
+    interval = health_config.get('interval_seconds', 15)
+    networks = sorted({source.network for source in ingest_sources})
+    while True:
+        await asyncio.gather(*(
+            probe_endpoint(endpoint_schedulers[network], api_url)
+            for network in networks
+            for api_url in endpoint_schedulers[network].urls
+        ))
+        await asyncio.sleep(interval)
+
+# Circuit probes: a half-open endpoint gets one limit=1 query before it
+# carries real traffic again
+circuit_probes = {}  # {api_url: asyncio.Task}
+
+def probe_open_circuits(scheduler):
+    """Start a probe for every circuit whose back-off has expired, returning the new tasks"""
+    started = []
+    for api_url in scheduler.due_for_probe():
+        if api_url in circuit_probes:
+            continue
+        task = asyncio.create_task(timed_fetch_actions(scheduler, api_url, {'limit': 1}))
+        task.add_done_callback(lambda task, api_url=api_url: circuit_probes.pop(api_url, None))
+        # Retrieve the exception so a failed probe is not reported as unhandled
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        circuit_probes[api_url] = task
+        started.append(task)
+    return started
+
+async def wait_for_endpoint(networks):
+    """Wait until some network in use has a closed circuit, probing as back-offs expire
+
+    Returns False straight away if one already does, True once one recovers.
+    """
+    schedulers = [endpoint_schedulers[network] for network in networks]
+    if not schedulers or any(scheduler.available() for scheduler in schedulers):
+        return False
+    
+    endpoint_log.error("all_circuits_open", networks=",".join(networks))
+    while not any(scheduler.available() for scheduler in schedulers):
+        for scheduler in schedulers:
+            probe_open_circuits(scheduler)
+        if circuit_probes:
+            await asyncio.wait(list(circuit_probes.values()), return_when=asyncio.FIRST_COMPLETED)
+            continue
+        retries = [retry for retry in (scheduler.next_retry() for scheduler in schedulers) if retry is not None]
+        await asyncio.sleep(max(0.05, min(retries) - time.monotonic()) if retries else 1)
+    return True
+
+hyperion_request_seconds = metrics.histogram(
+    'hyperion_request_seconds', "get_actions latency per endpoint", ('endpoint', 'outcome'))
+
+async def timed_fetch_actions(scheduler, api_url, params):
+    """fetch_actions that feeds its latency or failure into the endpoint scheduler"""
+    scheduler.mark_used(api_url)
+    start = time.perf_counter()
+    try:
+        data = await fetch_actions(api_url, params)
+    except asyncio.CancelledError:
+        # Lost a hedge race without answering; the elapsed time is only a lower bound
+        scheduler.record_latency_floor(api_url, time.perf_counter() - start)
+        hyperion_request_seconds.observe(time.perf_counter() - start, api_url, 'cancelled')
+        raise
+    except Exception:
+        scheduler.record_failure(api_url)
+        hyperion_request_seconds.observe(time.perf_counter() - start, api_url, 'error')
+        raise
+    scheduler.record_success(api_url, time.perf_counter() - start)
+    hyperion_request_seconds.observe(time.perf_counter() - start, api_url, 'ok')
+    scheduler.record_head(api_url, data)
+    return data
+
+async def fetch_actions_scheduled(params, network=NETWORK):
+    """Query the best-ranked endpoint, hedging or failing over to the runner-up
+
+    Returns (api_url, data) from whichever endpoint answered first. At most
+    ``max_attempts`` endpoints are contacted for a single query.
+    """
+    hedging = endpoint_config.get('hedging', True)
+    min_hedge_delay = endpoint_config.get('hedge_min_delay_ms', 250) / 1000
+    max_attempts = endpoint_config.get('max_attempts', 2)
+    scheduler = endpoint_schedulers[network]
+    candidates = scheduler.ranked()[:max_attempts]
+    if not candidates:
+        raise ConnectionError(f"every {network} endpoint circuit is open")
+    
+    pending = {}
+    launched = 0
+    last_error = None
+    
+    def launch_next():
+        nonlocal launched
+        api_url = candidates[launched]
+        launched += 1
+        pending[asyncio.create_task(timed_fetch_actions(scheduler, api_url, params))] = api_url
+    
+    launch_next()
+    try:
+        while pending:
+            timeout = None
+            if hedging and launched < len(candidates):
+                timeout = scheduler.hedge_delay(candidates[0], min_hedge_delay)
+            
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            
+            if not done:
+                # Primary is past its p95 deadline, race the runner-up against it
+                endpoint_log.debug("request_hedged", endpoint=candidates[0], hedge=candidates[launched])
+                launch_next()
+                continue
+            
+            for task in done:
+                api_url = pending.pop(task)
+                try:
+                    return api_url, task.result()
+                except Exception as e:
+                    endpoint_log.warning("request_failed", endpoint=api_url, error=e)
+                    last_error = e
+            
+            if not pending and launched < len(candidates):
+                launch_next()
+    finally:
+        for task in pending:
+            task.cancel()
+    
+    raise last_error
+
+MAX_GLOBAL_SEQUENCE = 2 ** 63 - 1
+
+def action_key(action):
+    """Chain order of an action as plain integers"""
+    return int(action['global_sequence']), action.get('action_ordinal', 0)
+
+# Cursor timestamps are always the block time of an action itself (or the
+# start time). cursor_params is the only place that turns one into a query
+# bound, so every cursor is read with the same inclusive rule.
+def make_cursor(action):
+    """Cursor pointing just past the given action"""
+    global_sequence, action_ordinal = action_key(action)
+    return {
+        'global_sequence': global_sequence,
+        'action_ordinal': action_ordinal,
+        'timestamp': action.get('@timestamp', action.get('timestamp', ''))
+    }
+
+def cursor_before(action):
+    """Cursor from which a fetch returns the given action again"""
+    return {
+        'global_sequence': int(action['global_sequence']) - 1,
+        'action_ordinal': 0,
+        'timestamp': action.get('@timestamp', action.get('timestamp', ''))
+    }
+
+def cursor_key(cursor):
+    """Comparable (global_sequence, action_ordinal) of a cursor; before everything if unset"""
+    if cursor.get('global_sequence') is None:
+        return (-1, 0)
+    return cursor['global_sequence'], cursor.get('action_ordinal', 0)
+
+def newer_cursor(current, candidate):
+    """Whichever of two cursors is further along, so cursors never move backwards"""
+    if current is None or cursor_key(candidate) > cursor_key(current):
+        return candidate
+    return current
+
+def cursor_params(cursor):
+    """get_actions filters selecting everything after a cursor
+
+    'after' is sent 1 ms before the cursor's timestamp. The rest of the
+    cursor's block shares that timestamp, and nodes differ on whether
+    'after' is inclusive, so this never skips it on either kind. The
+    global_sequence range, the cursor_key filter and the dedup window drop
+    what is returned twice.
+    """
+    # The timestamp bounds the search on nodes without global_sequence range support
+    moment = parse_chain_time(cursor['timestamp']) - timedelta(milliseconds=1)
+    params = {'after': moment.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]}
+    if cursor.get('global_sequence') is not None:
+        params['global_sequence'] = f"{cursor['global_sequence'] + 1}-{MAX_GLOBAL_SEQUENCE}"
+    return params
+
+async def fetch_actions_since(params, cursor, network=NETWORK, deadline=None):
+    """Fetch every action after the cursor in ascending order
+
+    Starts with a cheap tail request. If that page comes back full the node
+    has a backlog, so the remaining pages are planned from the reported hit
+    count and fetched with bounded concurrency. Returns (actions, new cursor,
+    has_more, fetched) where has_more means the page budget or the deadline
+    ran out before reaching the head, and fetched maps each action_key to
+    the (endpoint, time) its page arrived from.
+    """
+    tail_limit = config.get('polling', {}).get('tail_limit', 20)
+    expires = time.monotonic() + deadline if deadline else None
+    
+    base_params = dict(params, sort='asc', **cursor_params(cursor))
+    api_url, data = await asyncio.wait_for(
+        fetch_actions_scheduled(dict(base_params, limit=tail_limit), network), deadline)
+    actions = data.get('actions', [])
+    fetched = {}
+    stamp_fetched(fetched, actions, api_url)
+    
+    has_more = False
+    if len(actions) == tail_limit:
+        has_more = await fetch_backlog_pages(api_url, data, base_params, actions, fetched, network, expires)
+    
+    # Integer cursor comparison drops anything a coarse timestamp filter let through
+    after_key = cursor_key(cursor)
+    actions = [action for action in actions if action_key(action) > after_key]
+    actions.sort(key=action_key)
+    
+    new_cursor = make_cursor(actions[-1]) if actions else cursor
+    return actions, new_cursor, has_more, fetched
+
+async def fetch_backlog_pages(api_url, data, base_params, actions, fetched, network, expires=None):
+    """Fetch the pages after a full tail page into actions, returning whether more remain
+
+    Every page comes from the endpoint that served the tail page. Skip
+    offsets are only meaningful within one node's index, and a node that
+    lags or holds a different set of hits would shift the pages out of
+    order or leave holes behind the cursor.
+
+    Pages still outstanding at ``expires`` (a time.monotonic() deadline),
+    or that failed, are dropped along with every page after them. The
+    cursor then advances over the unbroken run fetched so far and the next
+    cycle resumes from there.
+    """
+    polling_config = config.get('polling', {})
+    tail_limit = polling_config.get('tail_limit', 20)
+    page_size = polling_config.get('catchup_page_size', 100)
+    max_pages = polling_config.get('catchup_max_pages', 20)
+    concurrency = polling_config.get('catchup_concurrency', 3)
+    
+    total = data.get('total', 0)
+    exact = True
+    if isinstance(total, dict):
+        # Hyperion reports large hit counts as a lower bound ("gte")
+        exact = total.get('relation', 'eq') == 'eq'
+        total = total.get('value', 0)
+    remaining = max(total - tail_limit, page_size)
+    pages = min(max_pages, -(-remaining // page_size))
+    ingest_log.info("catching_up", endpoint=api_url, remaining=remaining, pages=pages)
+    
+    scheduler = endpoint_schedulers[network]
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def fetch_page(index):
+        async with semaphore:
+            page_params = dict(base_params, limit=page_size, skip=tail_limit + index * page_size)
+            page = await timed_fetch_actions(scheduler, api_url, page_params)
+            page_actions = page.get('actions', [])
+            stamp_fetched(fetched, page_actions, api_url)
+            return page_actions
+    
+    tasks = [asyncio.create_task(fetch_page(index)) for index in range(pages)]
+    timeout = max(0, expires - time.monotonic()) if expires else None
+    try:
+        await asyncio.wait(tasks, timeout=timeout)
+    finally:
+        for task in tasks:
+            task.cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    
+    batches = []
+    for index, result in enumerate(results):
+        if isinstance(result, BaseException):
+            error = 'deadline' if isinstance(result, asyncio.CancelledError) else result
+            ingest_log.warning("catchup_truncated", endpoint=api_url, pages=index, error=error)
+            return True
+        batches.append(result)
+        actions.extend(result)
+    
+    # A short page at any offset means the head was reached
+    if any(len(batch) < page_size for batch in batches):
+        return False
+    # Every page was full; more remain unless the hit count says that was all
+    return not (exact and total) or total > tail_limit + pages * page_size
+
+class Route:
+    """One subscription: actions from an account that should reach some channels"""
+
+    def __init__(self, network, account, actions, data_filter, memo, channels):
+        self.network = network
+        self.account = account
+        self.actions = set(actions) if actions else None  # None means every action
+        self.data_filter = data_filter
+        self.memo = re.compile(memo) if memo else None
+        self.channels = channels
+
+    def matches(self, action):
+        act = action['act']
+        if self.actions is not None and act['name'] not in self.actions:
+            return False
+        if self.memo and not self.memo.match(str(act['data'].get('memo', ''))):
+            return False
+        return True
+
+class IngestSource:
+    """One get_actions query per cycle, shared by every route it can serve
+
+    Routes for the same (network, account) and action data filter are
+    fetched together and fanned out after the fact.
+    """
+
+    def __init__(self, network, account, data_filter):
+        self.network = network
+        self.account = account
+        self.data_filter = data_filter  # {field: value} matched against act.data
+        self.routes = []
+        self.cursor = None
+        filter_suffix = ''.join(f",{field}={value}" for field, value in sorted(data_filter.items()))
+        self.key = f"{network}:{account}{filter_suffix}"
+
+    def actions(self):
+        """Union of the action names the routes want, or None if any route wants all"""
+        names = set()
+        for route in self.routes:
+            if route.actions is None:
+                return None
+            names |= route.actions
+        return sorted(names)
+
+    def params(self):
+        """get_actions filters selecting this source's actions"""
+        actions = self.actions()
+        if self.data_filter:
+            # Let Hyperion filter on action data instead of downloading every
+            # chain-wide action for the account and discarding them here
+            params = {f"act.data.{field}": value for field, value in self.data_filter.items()}
+            if actions:
+                params['filter'] = ','.join(f"{self.account}:{name}" for name in actions)
+            else:
+                params['filter'] = f"{self.account}:*"
+            return params
+        params = {'account': self.account}
+        if actions:
+            params['action'] = ','.join(actions)
+        return params
+
+    def accepts(self, action):
+        """Whether an action belongs to this source (guards against nodes ignoring filters)"""
+        data = action['act']['data']
+        return all(str(data.get(field)) == str(value) for field, value in self.data_filter.items())
+
+def load_subscriptions():
+    """Subscriptions from config.yml, or the CONTRACT/CHANNEL_ID defaults"""
+    subscriptions = config.get('subscriptions')
+    if subscriptions:
+        return subscriptions
+    return [
+        {'network': NETWORK, 'account': CONTRACT, 'actions': CONTRACT_ACTIONS, 'channels': [CID]},
+        {'network': NETWORK, 'account': 'atomicassets', 'actions': ['logtransfer'], 'data': {'to': CONTRACT}, 'channels': [CID]}
+    ]
+
+def build_ingest_sources(subscriptions):
+    """Group subscriptions into one IngestSource per (network, account, data filter)"""
+    sources = {}
+    for subscription in subscriptions:
+        network = str(subscription.get('network', NETWORK)).lower()
+        if network not in API_ENDPOINTS:
+            ingest_log.warning("subscription_skipped", network=network, subscription=subscription)
+            continue
+        account = subscription.get('account', CONTRACT)
+        data_filter = subscription.get('data') or {}
+        actions = subscription.get('actions')
+        if isinstance(actions, str):
+            actions = None if actions == '*' else [actions]
+        route = Route(
+            network,
+            account,
+            actions,
+            data_filter,
+            subscription.get('memo'),
+            [int(channel_id) for channel_id in subscription.get('channels', [CID])]
+        )
+        source = IngestSource(network, account, data_filter)
+        source = sources.setdefault(source.key, source)
+        source.routes.append(route)
+    return list(sources.values())
+
+ingest_sources = build_ingest_sources(load_subscriptions())
+
+async def fetch_source_actions(source, deadline=None):
+    """Fetch new actions for a source, returning (actions oldest first, new cursor, has_more, fetched)"""
+    actions, cursor, has_more, fetched = await fetch_actions_since(source.params(), source.cursor, source.network, deadline)
+    
+    ingest_log.debug("actions_found", source=source.key, count=len(actions))
+    
+    accepted = []
+    for action in actions:
+        if source.accepts(action):
+            action['network'] = source.network
+            accepted.append(action)
+    return accepted, cursor, has_more, fetched
+
+class AdaptiveInterval:
+    """Poll delay that backs off while the contract is idle and snaps back on activity"""
+
+    def __init__(self, fast, ceiling, backoff, lag_threshold):
+        self.fast = fast
+        self.ceiling = max(fast, ceiling)
+        self.backoff = backoff
+        self.lag_threshold = lag_threshold
+        self.current = fast
+
+    def next_delay(self, found_actions, has_more, head_lag):
+        """Seconds to wait before the next poll"""
+        if has_more:
+            # Still draining a backlog
+            return 0
+        if found_actions:
+            self.current = self.fast
+        else:
+            self.current = min(self.ceiling, self.current * self.backoff)
+        if head_lag is not None and head_lag > self.lag_threshold:
+            # The index is behind the chain, so actions we have not seen yet are
+            # about to land; keep polling fast until it catches up
+            return self.fast
+        return self.current
+
+poll_query_failures = metrics.counter(
+    'poll_query_failures_total', "Poll queries that timed out or failed", ('source', 'reason'))
+
+async def run_poll_query(name, coro, deadline):
+    """Await one poll query, returning None if it fails
+
+    The query applies the deadline itself, so a slow catch-up returns the
+    pages it already has instead of being discarded as a whole.
+    """
+    try:
+        return await coro
+    except asyncio.TimeoutError:
+        ingest_log.warning("poll_timeout", source=name, deadline=deadline)
+        poll_query_failures.inc(name, 'timeout')
+    except Exception as e:
+        ingest_log.warning("poll_failed", source=name, error=e)
+        poll_query_failures.inc(name, 'error')
+    return None
+
+class DedupWindow:
+    """Fixed-capacity set of recently seen keys with oldest-first eviction
+
+    A ring buffer remembers insertion order and a set indexes it, so
+    lookups, inserts and evictions are O(1) and memory never grows past
+    ``capacity`` keys.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ring = [None] * capacity
+        self.index = set()
+        self.position = 0
+        self.duplicates = 0  # How many repeats have been suppressed
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def add(self, key):
+        """Remember key, returning False if it was already in the window"""
+        if key in self.index:
+            self.duplicates += 1
+            return False
+        evicted = self.ring[self.position]
+        if evicted is not None:
+            self.index.discard(evicted)
+        self.ring[self.position] = key
+        self.index.add(key)
+        self.position = (self.position + 1) % self.capacity
+        return True
+
+    def keys(self):
+        """Keys currently in the window, oldest first"""
+        ordered = self.ring[self.position:] + self.ring[:self.position]
+        return [key for key in ordered if key is not None]
+
+processed_actions = DedupWindow(config.get('polling', {}).get('dedup_window', 5000))
+
+discord_send_seconds = metrics.histogram('discord_send_seconds', "channel.send latency")
+discord_send_failures = metrics.counter('discord_send_failures_total', "Discord messages that failed to send")
+discord_rate_limit_wait = metrics.counter(
+    'discord_rate_limit_wait_seconds_total', "Seconds senders spent pacing to the channel rate limit")
+# End-to-end latency: every notification carries wall-clock stamps from
+# block time to send completion, recorded per stage and per endpoint
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60, 120, 300, 600)
+action_stage_seconds = metrics.histogram(
+    'action_stage_seconds', "Latency of each pipeline stage, block time to Discord", ('stage', 'endpoint'),
+    buckets=STAGE_BUCKETS)
+
+class LatencyTracker:
+    """Rolling p50/p95/p99 of each pipeline stage, overall and per endpoint
+
+    Stages: fetch (block time to fetched from Hyperion), digest (held in an
+    open digest window, digested actions only), render (fetched to embed
+    built, less any digest hold), queue (built to send started, including
+    rate-limit pacing), send (channel.send) and total (block time to
+    posted).
+    """
+
+    STAGES = ('fetch', 'digest', 'render', 'queue', 'send', 'total')
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.samples = {}  # {(stage, endpoint or None): deque of seconds}
+
+    def record(self, stage, endpoint, seconds):
+        seconds = max(0.0, seconds)
+        for key in ((stage, None), (stage, endpoint)):
+            samples = self.samples.get(key)
+            if samples is None:
+                samples = self.samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+        action_stage_seconds.observe(seconds, stage, endpoint)
+
+    def record_delivery(self, trace, send_started, sent_at):
+        """Record every stage of one delivered action from its trace"""
+        endpoint = trace['endpoint'] or 'unknown'
+        digest_wait = trace['digest_wait']
+        fetched_at = trace['fetched_at'] or trace['rendered_at'] - digest_wait
+        self.record('fetch', endpoint, fetched_at - trace['block_time'])
+        if digest_wait:
+            self.record('digest', endpoint, digest_wait)
+        self.record('render', endpoint, trace['rendered_at'] - digest_wait - fetched_at)
+        self.record('queue', endpoint, send_started - trace['rendered_at'])
+        self.record('send', endpoint, sent_at - send_started)
+        self.record('total', endpoint, sent_at - trace['block_time'])
+
+    def percentiles(self, stage, endpoint=None):
+        """[p50, p95, p99] of a stage's rolling window, or None without samples"""
+        samples = self.samples.get((stage, endpoint))
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return [ordered[min(len(ordered) - 1, int(len(ordered) * quantile))] for quantile in self.QUANTILES]
+
+    def endpoints(self):
+        return sorted({endpoint for _, endpoint in self.samples if endpoint is not None})
+
+latency_tracker = LatencyTracker(config.get('latency', {}).get('window', 1000))
+
+def collect_stage_quantiles():
+    values = {}
+    for stage in LatencyTracker.STAGES:
+        for quantile, value in zip(LatencyTracker.QUANTILES, latency_tracker.percentiles(stage) or []):
+            values[(stage, quantile)] = value
+    return values
+
+metrics.gauge(
+    'action_stage_quantile_seconds', "Rolling quantiles of each pipeline stage", ('stage', 'quantile'),
+    collect=collect_stage_quantiles)
+
+def stamp_fetched(fetched, actions, endpoint):
+    """Note in fetched ({action_key: (endpoint, time)}) where and when actions arrived"""
+    stamp = (endpoint, time.time())
+    for action in actions:
+        fetched[action_key(action)] = stamp
+
+def latency_trace(action, fetched=None, digest_wait=0.0):
+    """Stamps an embed carries through the outbound queue, taken as it is rendered
+
+    fetched is the (endpoint, time) the action arrived with, and digest_wait
+    the seconds it was held in a digest window before rendering.
+    """
+    endpoint, fetched_at = fetched or (None, None)
+    return {
+        'block_time': action_time(action).timestamp(),
+        'fetched_at': fetched_at,
+        'digest_wait': digest_wait,
+        'rendered_at': time.time(),
+        'endpoint': endpoint
+    }
+
+class OutboundDispatcher:
+    """Per-channel notification queues drained by background sender tasks
+
+    The poller only enqueues embeds. Each channel's sender packs whatever
+    is waiting into messages of up to 10 embeds (Discord's per-message
+    limit, and at most 6000 characters) and paces itself to the channel's
+    message rate limit, so bursts never stall ingest. Transient failures
+    (network errors, Discord 5xx/429) are retried with exponential back-off.
+    Once a message is sent or given up on, its delivery keys are released
+    from the DeliveryLedger so the checkpoint can move past them.
+    """
+
+    MAX_EMBEDS = 10
+    MAX_CHARACTERS = 6000
+
+    def __init__(self, rate=5, per=5.0, max_retries=5, retry_base_seconds=1.0):
+        self.rate = rate  # Messages allowed per channel...
+        self.per = per  # ...within this many seconds
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.queues = {}  # {channel_id: asyncio.Queue of (embed, latency trace or None, delivery keys)}
+        self.senders = {}  # {channel_id: asyncio.Task}
+        self.recent_sends = {}  # {channel_id: deque of send times}
+        self.messages_sent = 0
+        self.embeds_sent = 0
+        self.send_failures = 0
+        self.rate_limit_wait = 0.0  # Total seconds spent pacing
+        self.send_latencies = deque(maxlen=100)  # Seconds per channel.send
+
+    def enqueue(self, channel, embed, trace=None, deliveries=()):
+        """Queue an embed for a channel without waiting for it to be sent"""
+        queue = self.queues.get(channel.id)
+        if queue is None:
+            queue = self.queues[channel.id] = asyncio.Queue()
+            self.senders[channel.id] = asyncio.create_task(self.sender(channel, queue))
+        queue.put_nowait((embed, trace, deliveries))
+
+    def queue_depth(self):
+        return sum(queue.qsize() for queue in self.queues.values())
+
+    async def wait_for_slot(self, channel_id):
+        """Sleep until sending another message stays within the channel's rate limit"""
+        sent_times = self.recent_sends.setdefault(channel_id, deque())
+        now = time.monotonic()
+        while sent_times and now - sent_times[0] >= self.per:
+            sent_times.popleft()
+        if len(sent_times) >= self.rate:
+            wait = self.per - (now - sent_times[0])
+            self.rate_limit_wait += wait
+            discord_rate_limit_wait.inc(amount=wait)
+            await asyncio.sleep(wait)
+            sent_times.popleft()
+        sent_times.append(time.monotonic())
+
+    @staticmethod
+    def is_transient(error):
+        """Whether a failed send is worth retrying"""
+        if isinstance(error, discord.HTTPException):
+            return error.status >= 500 or error.status == 429
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError))
+
+    async def send_with_retry(self, channel, batch):
+        """Send one message, retrying transient failures
+
+        Returns (wall time the successful send started, its latency), or
+        None if the message was given up on.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.wait_for_slot(channel.id)
+                send_started = time.time()
+                start = time.perf_counter()
+                await channel.send(embeds=batch)
+                return send_started, time.perf_counter() - start
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt < self.max_retries and self.is_transient(e):
+                    delay = self.retry_base_seconds * 2 ** attempt
+                    outbound_log.warning("send_retry", channel=channel.id, attempt=attempt + 1, delay=delay, error=e)
+                    await asyncio.sleep(delay)
+                    continue
+                self.send_failures += 1
+                discord_send_failures.inc()
+                outbound_log.error("send_failed", channel=channel.id, embeds=len(batch), attempts=attempt + 1, error=e)
+                return None
+
+    async def sender(self, channel, queue):
+        carry = None
+        while True:
+            first = carry or await queue.get()
+            carry = None
+            batch = [first[0]]
+            traces = [first[1]]
+            deliveries = list(first[2])
+            characters = len(first[0])
+            
+            # Pack everything already waiting, within Discord's message limits
+            while len(batch) < self.MAX_EMBEDS and not queue.empty():
+                item = queue.get_nowait()
+                if characters + len(item[0]) > self.MAX_CHARACTERS:
+                    carry = item
+                    break
+                batch.append(item[0])
+                traces.append(item[1])
+                deliveries.extend(item[2])
+                characters += len(item[0])
+            
+            try:
+                sent = await self.send_with_retry(channel, batch)
+                if sent:
+                    send_started, latency = sent
+                    self.send_latencies.append(latency)
+                    self.messages_sent += 1
+                    self.embeds_sent += len(batch)
+                    discord_send_seconds.observe(latency)
+                    sent_at = time.time()
+                    for trace in traces:
+                        if trace:
+                            latency_tracker.record_delivery(trace, send_started, sent_at)
+                    outbound_log.info("notifications_sent", channel=channel.id, embeds=len(batch), queued=queue.qsize())
+            finally:
+                # Sent or given up on; either way the checkpoint may move past it
+                for key in deliveries:
+                    delivery_ledger.delivered(key)
+                for _ in batch:
+                    queue.task_done()
+
+    async def flush(self, timeout):
+        """Give queued notifications up to timeout seconds to go out"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues.values())), timeout)
+        except asyncio.TimeoutError:
+            outbound_log.warning("flush_incomplete", queued=self.queue_depth())
+
+    def summary(self):
+        """Queue depth, sends and send latency as log fields"""
+        latencies = sorted(self.send_latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0
+        return {
+            'queued': self.queue_depth(),
+            'messages': self.messages_sent,
+            'embeds': self.embeds_sent,
+            'send_p95_ms': round(p95 * 1000),
+            'pacing_seconds': round(self.rate_limit_wait, 1)
+        }
+
+outbound_config = config.get('outbound', {})
+outbound = OutboundDispatcher(
+    rate=outbound_config.get('messages_per_window', 5),
+    per=outbound_config.get('window_seconds', 5),
+    max_retries=outbound_config.get('max_retries', 5),
+    retry_base_seconds=outbound_config.get('retry_base_seconds', 1)
+)
+metrics.gauge('outbound_queue_depth', "Embeds waiting to be sent", collect=lambda: {(): outbound.queue_depth()})
+
+class HeavyHitters:
+    """Approximate top-k counts in constant memory (Space-Saving algorithm)"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+
+    def add(self, key):
+        if key in self.counts:
+            self.counts[key] += 1
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = 1
+        else:
+            # Replace the smallest counter; its count becomes an upper bound for the newcomer
+            smallest = min(self.counts, key=self.counts.get)
+            self.counts[key] = self.counts.pop(smallest) + 1
+
+    def top(self, n):
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+class ActionDigest:
+    """Rolls one high-frequency action type into a single summary embed per window"""
+
+    def __init__(self, channel, act_name, settings):
+        self.channel = channel
+        self.act_name = act_name
+        self.window = settings.get('window_seconds', 30)
+        self.max_actions = settings.get('max_actions', 50)
+        self.item_field = settings.get('item_field')
+        self.item_label = settings.get('item_label', self.item_field)
+        self.title = settings.get('title', act_name)
+        self.top = settings.get('top', 5)
+        self.color = settings.get('color', 0xffaa00)
+        self.timer = None
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.deliveries = []  # DeliveryLedger keys released when the summary is sent
+        self.first_action = None
+        self.first_fetched = None  # (endpoint, time) the first action arrived with
+        self.first_added = None  # When the first action entered the window
+        self.last_action = None
+        self.wallets = HeavyHitters(self.top * 4)
+        self.items = HeavyHitters(self.top * 4)
+
+    def add(self, action, delivery=None, fetched=None):
+        """Fold an action into the current window, flushing on the size threshold"""
+        act_data = action['act']['data']
+        self.count += 1
+        if delivery:
+            self.deliveries.append(delivery)
+        if self.first_action is None:
+            self.first_action = action
+            self.first_fetched = fetched
+            self.first_added = time.time()
+        self.last_action = action
+        self.wallets.add(action_wallet(act_data) or 'Unknown')
+        if self.item_field and self.item_field in act_data:
+            self.items.add(str(act_data[self.item_field]))
+        
+        if self.count >= self.max_actions:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        """Queue the summary for the current window and start a new one"""
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if not self.count:
+            return
+        try:
+            if self.count == 1:
+                # Nothing to coalesce, send the normal notification
+                embed = render_action(self.first_action)
+            else:
+                embed = self.build_embed()
+            # Traced by the first action, which waited longest for the summary
+            trace = latency_trace(self.first_action, self.first_fetched, time.time() - self.first_added)
+            outbound.enqueue(self.channel, embed, trace, self.deliveries)
+        except Exception as e:
+            outbound_log.error("digest_failed", action=self.act_name, error=e)
+            for delivery in self.deliveries:
+                delivery_ledger.delivered(delivery)
+        self.reset()
+
+    def build_embed(self):
+        account = self.first_action['act']['account']
+        bloks_url = BLOKS_URLS.get(self.first_action.get('network'), BLOKS_URL)
+        first_time = action_time(self.first_action)
+        last_time = action_time(self.last_action)
+        description_parts = [
+            f"**{self.count}** `{self.act_name}` actions between <t:{int(first_time.timestamp())}:T> and <t:{int(last_time.timestamp())}:T>",
+            "",
+            "**Top Wallets:**"
+        ]
+        for wallet, count in self.wallets.top(self.top):
+            description_parts.append(f"`{wallet}` × {count}")
+        if self.items.counts:
+            description_parts.append("")
+            description_parts.append(f"**Top {self.item_label}:**")
+            for item, count in self.items.top(self.top):
+                description_parts.append(f"`{item}` × {count}")
+        
+        embed = discord.Embed(
+            title=f"{self.title} ×{self.count}",
+            description="\n".join(description_parts),
+            url=f"{bloks_url}/account/{account}",
+            timestamp=last_time,
+            color=self.color
+        )
+        embed.set_footer(text=f"{EMBED_FOOTER} • Digest")
+        return embed
+
+digests = {}  # {(channel_id, account, act_name): ActionDigest}
+
+def get_digest(channel, account, act_name):
+    """The open digest for an action type on a channel, or None if it is sent immediately"""
+    settings = config.get('digest', {}).get(act_name)
+    if not settings or not settings.get('enabled', True):
+        return None
+    digest = digests.get((channel.id, account, act_name))
+    if digest is None:
+        digest = digests[(channel.id, account, act_name)] = ActionDigest(channel, act_name, settings)
+    return digest
+
+def flush_digests():
+    """Queue every open digest window, used on shutdown"""
+    for digest in digests.values():
+        digest.flush()
+
+actions_ingested = metrics.counter('actions_ingested_total', "New actions routed", ('source',))
+actions_duplicate = metrics.counter('actions_duplicate_total', "Actions dropped by the dedup window", ('source',))
+
+# Action archive: every routed action is also appended to a compressed,
+# segmented on-disk archive indexed by trx_id, global_sequence and wallet
+# (see action_archive.py). Appending only buffers; blocks are compressed and
+# written off the event loop. It is opened by main() for live ingest only,
+# so importing bot.py (benchmark.py) or replaying never writes to it.
+def open_action_archive():
+    """The ActionArchive configured under 'archive', or None if it is disabled"""
+    archive_config = config.get('archive', {})
+    if not archive_config.get('enabled', True):
+        return None
+    return ActionArchive(
+        archive_config.get('path', 'action_archive'),
+        block_actions=archive_config.get('block_actions', 256),
+        segment_bytes=archive_config.get('segment_mb', 64) * 1024 * 1024,
+        segment_seconds=archive_config.get('segment_hours', 24) * 3600,
+        compression_level=archive_config.get('compression_level', 6)
+    )
+
+action_archive = None
+archive_write_seconds = metrics.histogram('archive_write_seconds', "Time to compress and write buffered actions to the archive")
+metrics.gauge('archive_segments', "Sealed archive segments on disk",
+              collect=lambda: {(): len(action_archive.segments) if action_archive else 0})
+
+@tasks.loop(seconds=10)
+async def flush_action_archive():
+    """Write full blocks of buffered actions to the archive"""
+    started = time.perf_counter()
+    try:
+        max_wait = config.get('archive', {}).get('max_buffer_seconds', 10)
+        await asyncio.to_thread(action_archive.flush, max_wait)
+    except Exception as e:
+        ingest_log.error("archive_write_failed", error=e)
+    archive_write_seconds.observe(time.perf_counter() - started)
+
+@tasks.loop(hours=1)
+async def maintain_action_archive():
+    """Roll the active segment, apply retention and compact small segments"""
+    archive_config = config.get('archive', {})
+    try:
+        await asyncio.to_thread(action_archive.seal_if_old)
+        if archive_config.get('retention_days'):
+            removed = await asyncio.to_thread(action_archive.apply_retention, archive_config['retention_days'] * 86400)
+            if removed:
+                ingest_log.info("archive_segments_expired", segments=removed)
+        if archive_config.get('compact_below_mb'):
+            merged = await asyncio.to_thread(action_archive.compact, archive_config['compact_below_mb'] * 1024 * 1024)
+            if merged:
+                ingest_log.info("archive_segments_compacted", segments=merged)
+    except Exception as e:
+        ingest_log.error("archive_maintenance_failed", error=e)
+
+# Activity stats: per-minute/hour/day counts by action type and wallet in
+# an embedded sqlite store (see activity_stats.py), answered by /stats.
+# Counts are batched in memory and upserted off the event loop. Like the
+# archive, it is opened by main() for live ingest only.
+def open_activity_stats():
+    """The ActivityStats store configured under 'stats', or None if it is disabled"""
+    stats_config = config.get('stats', {})
+    if not stats_config.get('enabled', True):
+        return None
+    return ActivityStats(
+        stats_config.get('path', 'activity_stats.db'),
+        retention={
+            'minute': stats_config.get('minute_retention_days', 2) * 86400,
+            'hour': stats_config.get('hour_retention_days', 90) * 86400
+        }
+    )
+
+activity_stats = None
+STATS_ACTIONS = config.get('stats', {}).get('actions', ['setbeevar', 'claim', 'unstake', 'stakehive', 'stakebees'])
+stats_flush_seconds = metrics.histogram('stats_flush_seconds', "Time to upsert batched activity counts")
+
+# Staking arrives as NFT transfers to the contract, told apart by memo (as
+# in the config.yml renderers)
+STAKE_MEMOS = (('stakehive', re.compile(r'^stakehive$')), ('stakebees', re.compile(r'^stakebees:')))
+
+def activity_type(action):
+    """The action's name, or stakehive/stakebees for a staking transfer"""
+    act = action['act']
+    if act['name'] in ('logtransfer', 'transfer'):
+        memo = act['data'].get('memo') or ''
+        for name, pattern in STAKE_MEMOS:
+            if pattern.match(memo):
+                return name
+    return act['name']
+
+def record_activity(action):
+    """Count a routed action in the activity rollups if its type is tracked"""
+    name = activity_type(action)
+    if name in STATS_ACTIONS:
+        activity_stats.record(action.get('network', NETWORK), name, action_wallet(action['act']['data']), action_time(action).timestamp())
+
+@tasks.loop(seconds=10)
+async def flush_activity_stats():
+    """Write batched activity counts to the rollup store"""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(activity_stats.flush)
+    except Exception as e:
+        ingest_log.error("stats_flush_failed", error=e)
+    stats_flush_seconds.observe(time.perf_counter() - started)
+
+@tasks.loop(hours=1)
+async def prune_activity_stats():
+    """Drop minute and hour rollups past their retention"""
+    try:
+        await asyncio.to_thread(activity_stats.prune)
+    except Exception as e:
+        ingest_log.error("stats_prune_failed", error=e)
+
+# Wallet watchlists: /watch subscribes a Discord user to a wallet's claims,
+# unstakes and stakes. The index is keyed by wallet, so matching an action
+# is one dict lookup however many watches exist, and alerts go out as DMs
+# through their own paced queue, apart from the channel feed.
+WAX_ACCOUNT = re.compile(r'^[a-z1-5.]{1,12}$')
+
+# Set by main() when watching the chain. Replayed recordings and benchmark
+# runs go through the same routing but must never DM real users.
+live_ingest = False
+
+class Watchlist:
+    """Persistent wallet -> watching users index, with the reverse index for /unwatch"""
+
+    def __init__(self, path, max_per_user=10):
+        self.path = path
+        self.max_per_user = max_per_user
+        self.watchers = {}  # {wallet: set of user ids}
+        self.watched = {}  # {user id: set of wallets}
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error loading watchlist: {e}")
+            return
+        for wallet, user_ids in data.get('wallets', {}).items():
+            for user_id in user_ids:
+                self.watchers.setdefault(wallet, set()).add(user_id)
+                self.watched.setdefault(user_id, set()).add(wallet)
+        print(f"Loaded {sum(len(users) for users in self.watchers.values())} wallet watch(es)")
+
+    def save(self):
+        """Atomically replace the watchlist file"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'wallets': {wallet: sorted(users) for wallet, users in self.watchers.items()}}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, user_id, wallet):
+        """Watch a wallet for a user; False if they are at max_per_user"""
+        wallets = self.watched.setdefault(user_id, set())
+        if wallet not in wallets and len(wallets) >= self.max_per_user:
+            return False
+        wallets.add(wallet)
+        self.watchers.setdefault(wallet, set()).add(user_id)
+        self.save()
+        return True
+
+    def remove(self, user_id, wallet=None):
+        """Stop watching one wallet, or every wallet if none is given; returns the wallets removed"""
+        wallets = self.watched.get(user_id, set())
+        removed = sorted(wallets if wallet is None else wallets & {wallet})
+        for name in removed:
+            wallets.discard(name)
+            users = self.watchers[name]
+            users.discard(user_id)
+            if not users:
+                del self.watchers[name]
+        if not wallets:
+            self.watched.pop(user_id, None)
+        if removed:
+            self.save()
+        return removed
+
+dm_sent = metrics.counter('watch_dms_sent_total', "Watchlist DMs delivered")
+dm_dropped = metrics.counter('watch_dms_dropped_total', "Watchlist DMs not delivered", ('reason',))
+
+class DirectMessageFanout:
+    """One bounded queue of (user id, embed) DMs, drained by a few workers at a global rate
+
+    A wallet with many watchers produces a burst here only; the channel
+    feed has its own queues in `outbound`. When the queue is full, new
+    DMs are dropped and counted rather than growing memory.
+    """
+
+    def __init__(self, per_second=5, workers=4, max_queued=10000):
+        self.interval = 1.0 / per_second
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=max_queued)
+        self.tasks = []
+        self.next_slot = 0.0
+        self.users = {}  # {user id: discord.User}, so each recipient is fetched once
+
+    def enqueue(self, user_id, embed):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        try:
+            self.queue.put_nowait((user_id, embed))
+        except asyncio.QueueFull:
+            dm_dropped.inc('queue_full')
+
+    async def wait_for_slot(self):
+        """Space sends interval seconds apart across all workers"""
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def get_user(self, user_id):
+        user = self.users.get(user_id) or bot.get_user(user_id)
+        if user is None:
+            user = await bot.fetch_user(user_id)
+        self.users[user_id] = user
+        return user
+
+    async def worker(self):
+        while True:
+            user_id, embed = await self.queue.get()
+            try:
+                await self.wait_for_slot()
+                user = await self.get_user(user_id)
+                await user.send(embed=embed)
+                dm_sent.inc()
+            except asyncio.CancelledError:
+                raise
+            except discord.Forbidden:
+                # DMs closed or no shared server; keep the watch in case they reopen them
+                dm_dropped.inc('forbidden')
+                outbound_log.warning("watch_dm_forbidden", user=user_id)
+            except Exception as e:
+                dm_dropped.inc('error')
+                outbound_log.error("watch_dm_failed", user=user_id, error=e)
+            finally:
+                self.queue.task_done()
+
+    async def flush(self, timeout):
+        """Give queued DMs up to timeout seconds to go out"""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            outbound_log.warning("watch_flush_incomplete", queued=self.queue.qsize())
+
+watch_config = config.get('watch', {})
+WATCH_ACTIONS = watch_config.get('actions', ['claim', 'unstake', 'stakehive'])
+watchlist = Watchlist(watch_config.get('path', 'watchlist.json'), watch_config.get('max_wallets_per_user', 10))
+if watch_config.get('enabled', True):
+    watchlist.load()
+dm_fanout = DirectMessageFanout(
+    per_second=watch_config.get('dms_per_second', 5),
+    workers=watch_config.get('workers', 4),
+    max_queued=watch_config.get('max_queued', 10000)
+)
+metrics.gauge('watch_dm_queue_depth', "Watchlist DMs waiting to be sent", collect=lambda: {(): dm_fanout.queue.qsize()})
+metrics.gauge('watched_wallets', "Wallets with at least one watcher", collect=lambda: {(): len(watchlist.watchers)})
+
+def notify_watchers(action):
+    """Queue a DM to everyone watching the wallet behind a claim, unstake or stake"""
+    act = action['act']
+    wallet = action_wallet(act['data'])
+    user_ids = watchlist.watchers.get(wallet)
+    if not user_ids or activity_type(action) not in WATCH_ACTIONS:
+        return
+    # One embed shared by every watcher's DM
+    try:
+        embed = render_action(action)
+    except Exception as e:
+        ingest_log.error("render_failed", action=act['name'], global_sequence=action.get('global_sequence'), error=e)
+        return
+    embed.set_author(name=f"👀 Watched wallet: {wallet}")
+    for user_id in user_ids:
+        dm_fanout.enqueue(user_id, embed)
+
+# Channels an action has already been queued for. Overlapping sources can
+# both fetch an action, so delivery is deduplicated per channel while the
+# archive, stats and watch alerts see it once (processed_actions)
+def subscribed_channel_ids():
+    return {channel for source in ingest_sources for route in source.routes for channel in route.channels}
+
+delivered_actions = DedupWindow(config.get('polling', {}).get('dedup_window', 5000) * max(1, len(subscribed_channel_ids())))
+
+class DeliveryLedger:
+    """Routed actions whose Discord notifications have not gone out yet
+
+    Queuing a notification is not sending it. Each routed action stays
+    here until every channel it was queued for has been sent (or given up
+    on). The checkpoint saves each source's cursor just before its oldest
+    such action and leaves their keys out of the saved dedup window, so a
+    crash makes the next start fetch and send them again.
+    """
+
+    def __init__(self):
+        self.in_flight = {}  # {source key: {action_key: [resume cursor, deliveries left]}}
+        self.owners = {}  # {(network, global_sequence, channel_id): (source key, action_key)}
+        self.settled = False  # An action finished delivering since the last checkpoint
+
+    def track(self, source, action, delivery_keys):
+        entries = self.in_flight.setdefault(source.key, {})
+        key = action_key(action)
+        entry = entries.get(key)
+        if entry is None:
+            entry = entries[key] = [cursor_before(action), 0]
+        for delivery in delivery_keys:
+            self.owners[delivery] = (source.key, key)
+            entry[1] += 1
+
+    def delivered(self, delivery):
+        owner = self.owners.pop(delivery, None)
+        if owner is None:
+            return
+        source_key, key = owner
+        entries = self.in_flight[source_key]
+        entries[key][1] -= 1
+        if not entries[key][1]:
+            del entries[key]
+            self.settled = True
+
+    def resume_cursor(self, source):
+        """The cursor to persist: the source's own, or just before its oldest undelivered action"""
+        entries = self.in_flight.get(source.key)
+        if not entries:
+            return source.cursor
+        return entries[min(entries)][0]
+
+    def undelivered(self):
+        return len(self.owners)
+
+delivery_ledger = DeliveryLedger()
+metrics.gauge('undelivered_notifications', "Channel notifications routed but not yet sent",
+              collect=lambda: {(): delivery_ledger.undelivered()})
+
+async def route_action(source, action, fetched=None):
+    """Fan one action out to every channel subscribed to it that has not had it yet
+
+    fetched is the (endpoint, time) the action arrived with, for latency tracking.
+    """
+    # Actions are keyed by (network, global_sequence), so several actions in
+    # one transaction each get their own notification
+    action_id = (source.network, int(action['global_sequence']))
+    if processed_actions.add(action_id):
+        if action_archive:
+            action_archive.append(action)
+        if activity_stats:
+            record_activity(action)
+        if live_ingest and watchlist.watchers:
+            notify_watchers(action)
+    
+    # A channel on several matching routes still gets a single notification
+    channel_ids = {}
+    for route in source.routes:
+        if route.matches(action):
+            channel_ids.update(dict.fromkeys(route.channels))
+    channel_ids = [channel_id for channel_id in channel_ids if delivered_actions.add((*action_id, channel_id))]
+    if not channel_ids:
+        actions_duplicate.inc(source.key)
+        return
+    actions_ingested.inc(source.key)
+    delivery_ledger.track(source, action, [(*action_id, channel_id) for channel_id in channel_ids])
+    for channel_id in channel_ids:
+        channel = bot.get_channel(channel_id)
+        if channel is None:
+            ingest_log.warning("channel_not_found", channel=channel_id)
+            delivery_ledger.delivered((*action_id, channel_id))
+            continue
+        await dispatch_action(action, channel, (*action_id, channel_id), fetched)
+
+async def dispatch_action(action, channel, delivery=None, fetched=None):
+    """Queue the Discord notification for one action on one channel"""
+    act = action['act']
+    act_name = act['name']
+    
+    ingest_log.debug("action_processed", action=act_name, global_sequence=action['global_sequence'], channel=channel.id, data=act['data'])
+    
+    try:
+        # High-frequency actions can be rolled into a periodic digest
+        digest = get_digest(channel, act['account'], act_name)
+        if digest:
+            # Held until the summary is sent, so the checkpoint stays behind it
+            digest.add(action, delivery, fetched)
+        else:
+            outbound.enqueue(channel, render_action(action), latency_trace(action, fetched), (delivery,) if delivery else ())
+    except Exception as e:
+        ingest_log.error("render_failed", action=act_name, global_sequence=action.get('global_sequence'), error=e)
+        delivery_ledger.delivered(delivery)
+
+# Ingest checkpoint: cursors and dedup window survive restarts
+def load_checkpoint():
+    """Load the ingest checkpoint from JSON file"""
+    path = config.get('checkpoint', {}).get('path', 'ingest_checkpoint.json')
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        ingest_log.info("checkpoint_missing")
+    except Exception as e:
+        ingest_log.error("checkpoint_load_failed", path=path, error=e)
+    return None
+
+def write_checkpoint(path, checkpoint):
+    """Atomically replace the checkpoint file so a crash never leaves it half written"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+async def save_checkpoint():
+    """Persist the ingest cursors and dedup window without blocking the event loop"""
+    path = config.get('checkpoint', {}).get('path', 'ingest_checkpoint.json')
+    # Nothing is recorded as done before it has been sent
+    delivery_ledger.settled = False
+    checkpoint = {
+        'cursors': {source.key: delivery_ledger.resume_cursor(source) for source in ingest_sources},
+        'processed_actions': processed_actions.keys(),
+        'delivered_actions': [key for key in delivered_actions.keys() if key not in delivery_ledger.owners],
+        'saved_at': datetime.now(timezone.utc).isoformat()
+    }
+    try:
+        await asyncio.to_thread(write_checkpoint, path, checkpoint)
+    except Exception as e:
+        ingest_log.error("checkpoint_save_failed", path=path, error=e)
+
+def restore_checkpoint(now):
+    """Resume cursors and dedup window from the checkpoint, limited to the backfill horizon"""
+    checkpoint = load_checkpoint()
+    if not checkpoint:
+        return False
+    
+    max_backfill_hours = config.get('checkpoint', {}).get('max_backfill_hours', 24)
+    horizon = now - timedelta(hours=max_backfill_hours)
+    horizon_cursor = {'global_sequence': None, 'timestamp': horizon.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]}
+    start_cursor = {'global_sequence': None, 'timestamp': bot_start_time}
+    
+    def clamp(cursor):
+        # A subscription added since the checkpoint starts now, like a first run
+        if not cursor:
+            return start_cursor
+        if parse_chain_time(cursor['timestamp']) < horizon:
+            return horizon_cursor
+        return cursor
+    
+    cursors = checkpoint.get('cursors', {})
+    # Checkpoints written before subscriptions kept one cursor per query
+    cursors.setdefault(f"{NETWORK}:{CONTRACT}", checkpoint.get('contract_cursor'))
+    cursors.setdefault(f"{NETWORK}:atomicassets,to={CONTRACT}", checkpoint.get('transfer_cursor'))
+    for source in ingest_sources:
+        source.cursor = clamp(cursors.get(source.key))
+    for key in checkpoint.get('processed_actions', []):
+        # JSON turns (network, global_sequence) into a list; older checkpoints stored bare ints
+        processed_actions.add(tuple(key) if isinstance(key, list) else (NETWORK, key))
+    if 'delivered_actions' in checkpoint:
+        for key in checkpoint['delivered_actions']:
+            delivered_actions.add(tuple(key))
+    else:
+        # Older checkpoints only knew an action was handled, which meant on every channel
+        for key in processed_actions.keys():
+            for channel_id in subscribed_channel_ids():
+                delivered_actions.add((*key, channel_id))
+    
+    for source in ingest_sources:
+        ingest_log.info("checkpoint_resumed", saved_at=checkpoint.get('saved_at'), source=source.key, start_from=source.cursor['timestamp'])
+    return True
+
+# Streaming ingest: a Hyperion action stream (socket.io over websocket)
+# pushes actions as they happen; the poller takes over whenever it drops
+polling_needed = asyncio.Event()
+polling_needed.set()
+streamed_sources = set()  # keys of sources the live stream is delivering
+stream_task = None
+
+def stream_socket_url(api_url):
+    """Engine.IO websocket URL of a Hyperion node's /stream endpoint"""
+    base = api_url.rstrip('/').replace('https://', 'wss://', 1).replace('http://', 'ws://', 1)
+    return f"{base}/stream/?EIO=4&transport=websocket"
+
+def stream_requests(sources):
+    """action_stream_request payloads, each resuming from its source's cursor"""
+    requests = []
+    for source in sources:
+        actions = source.actions()
+        requests.append({
+            'contract': source.account,
+            # The stream takes a single action name; several are filtered on arrival
+            'action': actions[0] if actions and len(actions) == 1 else '*',
+            'account': '',
+            'start_from': source.cursor['timestamp'],
+            'read_until': 0,
+            'filters': [{'field': f"act.data.{field}", 'value': value} for field, value in source.data_filter.items()]
+        })
+    return requests
+
+def stream_message_actions(message):
+    """Actions carried by one stream 'message' event"""
+    if message.get('type') != 'action_trace':
+        return []
+    if 'messages' in message:
+        return [json.loads(item) if isinstance(item, str) else item for item in message['messages']]
+    payload = message.get('message')
+    if not payload:
+        return []
+    return [json.loads(payload) if isinstance(payload, str) else payload]
+
+async def dispatch_streamed_action(action, sources, fetched=None):
+    """Route one streamed action through every source it matches, advancing their cursors"""
+    act = action.get('act', {})
+    matched = False
+    for source in sources:
+        if act.get('account') != source.account:
+            continue
+        actions = source.actions()
+        if actions is not None and act.get('name') not in actions:
+            continue
+        if not source.accepts(action) or action_key(action) <= cursor_key(source.cursor):
+            continue
+        action['network'] = source.network
+        await route_action(source, action, fetched)
+        source.cursor = newer_cursor(source.cursor, make_cursor(action))
+        matched = True
+    return matched
+
+async def run_stream(api_url, sources):
+    """Hold one stream connection open until it drops, dispatching everything it sends"""
+    stream_config = config.get('ingest', {}).get('stream', {})
+    connect_timeout = stream_config.get('connect_timeout_seconds', 10)
+    
+    # Own session without a total timeout, the connection is meant to stay open
+    timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.ws_connect(stream_socket_url(api_url)) as ws:
+            # Engine.IO open packet: "0{...pingInterval, pingTimeout...}"
+            opening = await ws.receive_str(timeout=connect_timeout)
+            if not opening.startswith('0'):
+                raise ConnectionError(f"unexpected open packet {opening[:40]!r}")
+            handshake = json.loads(opening[1:])
+            silence_limit = (handshake.get('pingInterval', 25000) + handshake.get('pingTimeout', 20000)) / 1000
+            
+            # Join the default socket.io namespace, then ask for every source's actions
+            await ws.send_str('40')
+            requests = stream_requests(sources)
+            for ack_id, request in enumerate(requests):
+                await ws.send_str(f"42{ack_id}" + json.dumps(['action_stream_request', request]))
+            
+            pending_acks = len(requests)
+            last_save = time.monotonic()
+            dispatched = False
+            try:
+                while True:
+                    msg = await ws.receive(timeout=silence_limit)
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        raise ConnectionError(f"stream closed ({msg.type.name})")
+                    packet = msg.data
+                    
+                    if packet == '2':
+                        # Engine.IO ping
+                        await ws.send_str('3')
+                    elif packet.startswith('43'):
+                        # Ack for an action_stream_request: "43<id>[{status...}]"
+                        reply = json.loads(packet[2:].lstrip('0123456789'))
+                        if not reply or reply[0].get('status') != 'OK':
+                            raise ConnectionError(f"stream request rejected: {reply}")
+                        pending_acks -= 1
+                        if pending_acks == 0:
+                            streamed_sources.update(source.key for source in sources)
+                            if all(source.key in streamed_sources for source in ingest_sources):
+                                stream_log.info("stream_live", endpoint=api_url, polling="paused")
+                                polling_needed.clear()
+                            else:
+                                stream_log.info("stream_live", endpoint=api_url, network=NETWORK, polling="other networks")
+                    elif packet.startswith('42'):
+                        event = json.loads(packet[2:])
+                        if event and event[0] == 'message':
+                            streamed = stream_message_actions(event[1])
+                            fetched = (api_url, time.time())
+                            for action in streamed:
+                                dispatched = await dispatch_streamed_action(action, sources, fetched) or dispatched
+                    elif packet.startswith('41') or packet == '1':
+                        raise ConnectionError("server closed the stream")
+                    
+                    # Checkpoint at most once a second while actions are flowing
+                    if dispatched and time.monotonic() - last_save >= 1:
+                        await save_checkpoint()
+                        last_save = time.monotonic()
+                        dispatched = False
+            finally:
+                if dispatched:
+                    await save_checkpoint()
+
+async def stream_listener():
+    """Keep a stream connection up, handing ingest back to the poller while it is down"""
+    # One connection to the bot's own network; sources on other networks keep polling
+    sources = [source for source in ingest_sources if source.network == NETWORK]
+    stream_config = config.get('ingest', {}).get('stream', {})
+    reconnect_delay = stream_config.get('reconnect_seconds', 5)
+    max_reconnect_delay = stream_config.get('max_reconnect_seconds', 120)
+    delay = reconnect_delay
+    
+    while True:
+        api_url = stream_config.get('url') or endpoint_schedulers[NETWORK].ranked()[0]
+        connected_at = time.monotonic()
+        try:
+            await run_stream(api_url, sources)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            stream_log.warning("stream_dropped", endpoint=api_url, error=repr(e))
+        
+        if streamed_sources:
+            stream_log.warning("stream_lost", polling="resumed")
+            streamed_sources.clear()
+            polling_needed.set()
+        
+        # A connection that stayed up for a while resets the back-off
+        if time.monotonic() - connected_at > max_reconnect_delay:
+            delay = reconnect_delay
+        await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+        delay = min(max_reconnect_delay, delay * 2)
+
+# Replay ingest: recorded get_actions responses or NDJSON action files are
+# fed through the same routing as live actions, for staging runs and
+# reproducible load tests without chain access
+async def run_replay():
+    """Route every recorded action, paced by block time unless speed is 0 (as fast as possible)"""
+    replay_config = config.get('ingest', {}).get('replay', {})
+    paths = replay_config.get('paths') or []
+    speed = float(replay_config.get('speed', 1) or 0)
+    
+    actions = await asyncio.to_thread(recorded_actions, paths)
+    ingest_log.info("replay_started", actions=len(actions), files=len(paths), speed=speed or 'max')
+    
+    # Replay from the start of the recording; never touch the live checkpoint
+    for source in ingest_sources:
+        source.cursor = {'global_sequence': None, 'timestamp': '1970-01-01T00:00:00.000'}
+    
+    routed = 0
+    start = time.perf_counter()
+    first_block_time = None
+    for index, action in enumerate(actions):
+        if speed:
+            block_time = action_time(action).timestamp()
+            first_block_time = first_block_time or block_time
+            # Sleep until this action's offset into the recording, scaled by speed
+            wait = (block_time - first_block_time) / speed - (time.perf_counter() - start)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        elif index % 100 == 0:
+            # Let the outbound senders run during a max-speed replay
+            await asyncio.sleep(0)
+        if await dispatch_streamed_action(action, ingest_sources, ('replay', time.time())):
+            routed += 1
+    
+    elapsed = time.perf_counter() - start
+    ingest_log.info("replay_finished", actions=len(actions), routed=routed, seconds=round(elapsed, 3),
+                    actions_per_second=round(len(actions) / elapsed) if elapsed else None)
+
+poll_cycle_seconds = metrics.histogram('poll_cycle_seconds', "Time to query every source and route the results")
+poll_delay_seconds = metrics.gauge('poll_delay_seconds', "Current delay between polls")
+
+async def http_listener():
+    global bot_start_time, stream_task, health_task
+    
+    await bot.wait_until_ready()
+    
+    now = datetime.now(timezone.utc)
+    bot_start_time = now.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    ingest_log.info("listener_started", start_time=bot_start_time)
+    
+    if config.get('ingest', {}).get('mode', 'poll') == 'replay':
+        await run_replay()
+        return
+    
+    # Backfill whatever happened while we were down; without a checkpoint
+    # only actions after the bot start time are announced
+    if not restore_checkpoint(now):
+        start_cursor = {'global_sequence': None, 'timestamp': bot_start_time}
+        for source in ingest_sources:
+            source.cursor = source.cursor or start_cursor
+    
+    ingest_log.info("monitoring", sources=",".join(source.key for source in ingest_sources))
+    
+    if health_config.get('enabled', True) and health_task is None:
+        health_task = asyncio.create_task(health_prober())
+    
+    if config.get('ingest', {}).get('mode', 'poll') == 'stream' and stream_task is None:
+        stream_task = asyncio.create_task(stream_listener())
+    
+    polling_config = config.get('polling', {})
+    query_deadline = polling_config.get('query_deadline_seconds', 20)
+    adaptive_config = polling_config.get('adaptive', {})
+    if adaptive_config.get('enabled', True):
+        poll_interval = AdaptiveInterval(
+            POLL_INTERVAL,
+            adaptive_config.get('max_interval_seconds', 30),
+            adaptive_config.get('backoff_factor', 1.5),
+            adaptive_config.get('lag_threshold_seconds', 5)
+        )
+    else:
+        poll_interval = AdaptiveInterval(POLL_INTERVAL, POLL_INTERVAL, 1, 0)
+    
+    while True:
+        # Idle while a live stream is delivering actions
+        await polling_needed.wait()
+        
+        # Sources are independent queries, so issue them together
+        cycle_start = time.perf_counter()
+        sources = [source for source in ingest_sources if source.key not in streamed_sources]
+        networks = sorted({source.network for source in sources})
+        for network in networks:
+            probe_open_circuits(endpoint_schedulers[network])
+        results = await asyncio.gather(*(
+            run_poll_query(source.key, fetch_source_actions(source, query_deadline), query_deadline)
+            for source in sources
+        ))
+        
+        batches = []
+        has_more = False
+        for source, result in zip(sources, results):
+            if result:
+                actions, new_cursor, source_more, fetched = result
+                source.cursor = newer_cursor(source.cursor, new_cursor)
+                has_more = has_more or source_more
+                batches.append([(action_key(action), source, action, fetched.get(action_key(action))) for action in actions])
+        
+        # Dispatch all result sets as one chain-ordered stream
+        found = False
+        for _, source, action, fetched in heapq.merge(*batches, key=lambda item: item[0]):
+            await route_action(source, action, fetched)
+            found = True
+        
+        if found:
+            await save_checkpoint()
+        poll_cycle_seconds.observe(time.perf_counter() - cycle_start)
+        
+        # With every circuit open, sit out the back-off and poll again the
+        # moment an endpoint recovers
+        if sources and all(result is None for result in results) and await wait_for_endpoint(networks):
+            continue
+        
+        # Wait before next poll
+        head_lags = [endpoint_schedulers[source.network].head_lag() for source in sources]
+        head_lags = [lag for lag in head_lags if lag is not None]
+        delay = poll_interval.next_delay(found, has_more, max(head_lags) if head_lags else None)
+        poll_delay_seconds.set(delay)
+        if delay:
+            await asyncio.sleep(delay)
+
+# ------------------------------------------------------------------
+# 8.  Entry-point
+# ------------------------------------------------------------------
+@bot.event
 async def on_ready():
     print(f"[{NETWORK}] Logged in as {bot.user}")
     print(f"Monitoring contract: {CONTRACT}")
@@ -1323,6 +3644,33 @@ async def on_ready():
         save_invite_data_periodic.start()
         print("Started periodic invite data saving task")
     
+    # Start outbound notification stats reporting
+    if not report_outbound_stats.is_running():
+        report_outbound_stats.start()
+        print("Started outbound stats reporting task")
+    
+    # Start endpoint circuit/health reporting
+    if not report_endpoint_state.is_running():
+        report_endpoint_state.start()
+        print("Started endpoint state reporting task")
+    
+    # Start saving the checkpoint as queued notifications are sent
+    if live_ingest and not checkpoint_deliveries.is_running():
+        checkpoint_deliveries.start()
+        print("Started delivery checkpoint task")
+    
+    # Start action archive writing and retention/compaction
+    if action_archive and not flush_action_archive.is_running():
+        flush_action_archive.start()
+        maintain_action_archive.start()
+        print("Started action archive tasks")
+    
+    # Start activity stats writing and pruning
+    if activity_stats and not flush_activity_stats.is_running():
+        flush_activity_stats.start()
+        prune_activity_stats.start()
+        print("Started activity stats tasks")
+    
     # Sync slash commands
     try:
         synced = await bot.tree.sync()
@@ -1330,13 +3678,75 @@ async def on_ready():
     except Exception as e:
         print(f"Failed to sync commands: {e}")
 
+async def start_metrics_server():
+    """Serve /metrics in Prometheus text format on a local port, returning the runner"""
+    metrics_config = config.get('metrics', {})
+    if not metrics_config.get('enabled', True):
+        return None
+    
+    async def handle_metrics(request):
+        return web.Response(
+            body=metrics.render().encode('utf-8'),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+    
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    host = metrics_config.get('host', '127.0.0.1')
+    port = metrics_config.get('port', 9108)
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        print(f"Could not serve metrics on {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
+
+def open_live_stores():
+    """Open the stores only live ingest writes to and enable watch DMs; replay runs leave them off"""
+    global action_archive, activity_stats, live_ingest
+    if config.get('ingest', {}).get('mode', 'poll') == 'replay':
+        return
+    action_archive = open_action_archive()
+    activity_stats = open_activity_stats()
+    live_ingest = True
+
 async def main():
     print(f"Starting Discord bot for {NETWORK} network...")
     print(f"Available HTTP API URLs: {HTTP_URLS}")
-    await asyncio.gather(
-        bot.start(TOKEN),
-        http_listener()
-    )
+    log_listener.start()
+    metrics_runner = None
+    try:
+        open_live_stores()
+        metrics_runner = await start_metrics_server()
+        await asyncio.gather(
+            bot.start(TOKEN),
+            http_listener()
+        )
+    finally:
+        if stream_task:
+            stream_task.cancel()
+        if health_task:
+            health_task.cancel()
+        flush_digests()
+        await outbound.flush(timeout=5)
+        await dm_fanout.flush(timeout=5)
+        if live_ingest:
+            # Whatever was sent is now done; anything still queued is refetched next start
+            await save_checkpoint()
+        if action_archive:
+            action_archive.close()
+        if activity_stats:
+            activity_stats.close()
+        await close_http_sessions()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        if not bot.is_closed():
+            await bot.close()
+        log_listener.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
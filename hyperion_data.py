@@ -0,0 +1,42 @@
+"""Reading Hyperion action data: block timestamps and recorded get_actions files
+
+Shared by the bot (replay mode), the action archive, the mock node and
+the benchmark, so they all parse timestamps and recordings the same way.
+A recording is either:
+
+    capture.json      one get_actions response, or a list of them
+    capture.ndjson    one response or one bare action per line (any other extension)
+"""
+import json
+from datetime import datetime, timezone
+
+
+def parse_chain_time(timestamp):
+    """Parse a Hyperion block timestamp, which is UTC with or without a trailing Z or offset"""
+    moment = datetime.fromisoformat(timestamp.rstrip('Z'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def read_recordings(paths):
+    """Yield each item of the recorded files in order: a get_actions response or a bare action"""
+    for path in paths:
+        with open(path, 'r') as f:
+            if path.endswith('.json'):
+                data = json.load(f)
+                yield from data if isinstance(data, list) else [data]
+                continue
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def recorded_actions(paths):
+    """Every action in the recorded files, in chain order"""
+    actions = []
+    for item in read_recordings(paths):
+        actions.extend(item['actions'] if 'actions' in item else [item])
+    actions.sort(key=lambda action: (int(action['global_sequence']), action.get('action_ordinal', 0)))
+    return actions
@@ -0,0 +1,482 @@
+"""Local stand-in for Hyperion nodes, for testing the bot without chain access
+
+Serves /v2/history/get_actions, /v2/health and the stream API from one
+shared, generated (or scripted) action history. Every ``--node`` is
+mounted under its own path prefix with its own latency distribution,
+error rate, stale head and payload padding, so failover and burst
+behaviour can be reproduced offline:
+
+    python3 mock_hyperion.py --port 7000 --contract farmforhoney --rate 5 \\
+        --node fast,latency=20 --node slow,latency=400,dist=lognormal \\
+        --node flaky,errors=0.3 --node stale,head_lag=45
+
+then list http://127.0.0.1:7000/fast, /slow, ... under ``endpoints.urls``
+in config.yml (and/or ``ingest.stream.url``). Without ``--node`` a single
+node is served at the root.
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import random
+import uuid
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+from hyperion_data import parse_chain_time, recorded_actions
+
+# ------------------------------------------------------------------
+# 1.  Synthetic actions
+# ------------------------------------------------------------------
+CONTRACT_ACTIONS = ['setbeevar', 'sethivevar', 'claim', 'unstake']
+WALLETS = [f"wallet{i}.wam" for i in range(1, 51)]
+BLOCK_SECONDS = 0.5
+
+
+def chain_time(moment=None):
+    """Hyperion's block timestamp format (UTC, millisecond precision, no zone)"""
+    return (moment or datetime.now(timezone.utc)).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]
+
+
+class ActionSource:
+    """Generates contract and atomicassets::logtransfer actions in chain order"""
+
+    def __init__(self, contract):
+        self.contract = contract
+        self.global_sequence = 1_000_000
+        self.block_num = 500_000
+
+    def next_action(self, account=None):
+        self.global_sequence += 1
+        self.block_num += 1
+        account = account or random.choice([self.contract, 'atomicassets'])
+        if account == 'atomicassets':
+            memo = random.choice(['stakehive', f"stakebees:{random.randint(1, 999)}"])
+            act = {
+                'account': 'atomicassets',
+                'name': 'logtransfer',
+                'data': {
+                    'collection_name': 'honeyfarms',
+                    'from': random.choice(WALLETS),
+                    'to': self.contract,
+                    'asset_ids': [str(random.randint(10 ** 12, 10 ** 13)) for _ in range(random.randint(1, 3))],
+                    'memo': memo
+                }
+            }
+        else:
+            name = random.choice(CONTRACT_ACTIONS)
+            act = {'account': self.contract, 'name': name, 'data': self.contract_data(name)}
+        return {
+            '@timestamp': chain_time(),
+            'timestamp': chain_time(),
+            'block_num': self.block_num,
+            'trx_id': uuid.uuid4().hex + uuid.uuid4().hex,
+            'act': act,
+            'global_sequence': self.global_sequence,
+            'action_ordinal': 1,
+            'producer': 'mockproducer'
+        }
+
+    def contract_data(self, name):
+        owner = random.choice(WALLETS)
+        if name == 'claim':
+            return {'owner': owner, 'hiveitem': random.randint(1, 999)}
+        if name == 'unstake':
+            return {'owner': owner, 'asset_id': str(random.randint(10 ** 12, 10 ** 13)), 'hive_id': random.randint(1, 999)}
+        if name == 'setbeevar':
+            return {
+                'type': random.choice(['worker', 'drone', 'queen']),
+                'rarity': random.choice(['common', 'rare', 'epic', 'legendary']),
+                'category': random.choice(['honey', 'pollen']),
+                'values': [round(random.random(), 4) for _ in range(4)]
+            }
+        return {'type': 'hive', 'rarity': random.choice(['common', 'rare']), 'values': [random.randint(1, 10)]}
+
+
+class Chain:
+    """The action history every node serves, plus live subscribers for the stream API"""
+
+    def __init__(self, source, capacity):
+        self.source = source
+        self.capacity = capacity
+        self.actions = []
+        self.times = []  # Epoch seconds of each action, for 'after' and staleness cuts
+        self.sequences = []  # global_sequence of each action, for range queries
+        self.subscribers = set()  # asyncio.Queue per stream connection
+
+    def append(self, action):
+        self.actions.append(action)
+        self.times.append(parse_chain_time(action.get('@timestamp') or action['timestamp']).timestamp())
+        self.sequences.append(int(action['global_sequence']))
+        for subscriber in self.subscribers:
+            subscriber.put_nowait(action)
+        # Trim in chunks so the lists are not shifted on every append
+        if len(self.actions) > self.capacity * 1.25:
+            excess = len(self.actions) - self.capacity
+            del self.actions[:excess], self.times[:excess], self.sequences[:excess]
+
+    def load_script(self, path):
+        """Append recorded actions (a .json get_actions response, or NDJSON)"""
+        loaded = recorded_actions([path])
+        for action in loaded:
+            self.append(action)
+        if loaded:
+            self.source.global_sequence = max(self.source.global_sequence, self.sequences[-1])
+        print(f"Loaded {len(loaded)} scripted actions from {path}")
+
+    def history(self, start_from):
+        """Retained actions from a stream request's start_from (block number or timestamp) onward"""
+        if not start_from:
+            return []
+        if isinstance(start_from, str) and not start_from.isdigit():
+            return self.actions[bisect.bisect_left(self.times, parse_chain_time(start_from).timestamp()):]
+        return [action for action in self.actions if int(action.get('block_num', 0)) >= int(start_from)]
+
+    async def produce(self, rate, bursts):
+        """Generate actions at ``rate`` per second, plus (count, at_seconds) bursts"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        pending_bursts = sorted(bursts, key=lambda burst: burst[1])
+        while True:
+            delay = random.expovariate(rate) if rate > 0 else 3600
+            if pending_bursts:
+                delay = min(delay, max(0.0, started + pending_bursts[0][1] - loop.time()))
+            await asyncio.sleep(delay)
+            if pending_bursts and loop.time() >= started + pending_bursts[0][1]:
+                count, _ = pending_bursts.pop(0)
+                print(f"Burst of {count} actions")
+                for _ in range(count):
+                    self.append(self.source.next_action())
+            elif rate > 0:
+                self.append(self.source.next_action())
+
+    def head_block(self):
+        return self.source.block_num
+
+
+# ------------------------------------------------------------------
+# 2.  Node profiles
+# ------------------------------------------------------------------
+class NodeProfile:
+    """How one simulated node misbehaves
+
+    Parsed from ``name,key=value,...``:
+      latency   mean response time in ms (default 0)
+      jitter    spread in ms for dist=uniform (default latency / 2)
+      dist      fixed | uniform | exponential | lognormal (default fixed)
+      errors    probability a request fails with HTTP 500 (default 0)
+      head_lag  seconds the node's head block trails the chain (default 0)
+      index_lag seconds its index trails its head block (default 0)
+      pad       bytes of padding added to every returned action (default 0)
+    """
+
+    def __init__(self, spec):
+        name, *options = spec.split(',')
+        values = dict(option.split('=', 1) for option in options if option)
+        self.name = name
+        self.latency = float(values.get('latency', 0)) / 1000
+        self.jitter = float(values.get('jitter', self.latency * 500)) / 1000
+        self.dist = values.get('dist', 'fixed')
+        self.errors = float(values.get('errors', 0))
+        self.head_lag = float(values.get('head_lag', 0))
+        self.index_lag = float(values.get('index_lag', 0))
+        self.pad = int(values.get('pad', 0))
+        if self.dist not in ('fixed', 'uniform', 'exponential', 'lognormal'):
+            raise ValueError(f"unknown latency distribution {self.dist!r}")
+
+    def sample_latency(self):
+        if self.latency <= 0:
+            return 0.0
+        if self.dist == 'uniform':
+            return max(0.0, random.uniform(self.latency - self.jitter, self.latency + self.jitter))
+        if self.dist == 'exponential':
+            return random.expovariate(1 / self.latency)
+        if self.dist == 'lognormal':
+            # Median at the configured latency with a long right tail
+            return random.lognormvariate(0, 0.75) * self.latency
+        return self.latency
+
+    def fails(self):
+        return random.random() < self.errors
+
+    def staleness(self):
+        """Seconds of history this node cannot see yet"""
+        return self.head_lag + self.index_lag
+
+    def describe(self):
+        return (f"{self.name}: latency {self.latency * 1000:.0f}ms ({self.dist}), errors {self.errors:.0%}, "
+                f"head lag {self.head_lag:.0f}s, index lag {self.index_lag:.0f}s, pad {self.pad}B")
+
+
+# ------------------------------------------------------------------
+# 3.  History and health API
+# ------------------------------------------------------------------
+def action_field(action, path):
+    value = action
+    for part in path.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def matches_query(action, query):
+    """Whether an action satisfies the get_actions filters the bot uses"""
+    act = action['act']
+    account = query.get('account')
+    if account and account != act['account'] and account not in (
+            act['data'].get('from'), act['data'].get('to'), act['data'].get('owner')):
+        return False
+    names = query.get('action')
+    if names and act['name'] not in names.split(','):
+        return False
+    filters = query.get('filter')
+    if filters:
+        accepted = [item.split(':', 1) for item in filters.split(',')]
+        if not any(contract in ('*', act['account']) and name in ('*', act['name']) for contract, name in accepted):
+            return False
+    for key, value in query.items():
+        if key.startswith('act.data.') and str(action_field(action, key)) != value:
+            return False
+    return True
+
+
+async def simulate(request):
+    """Apply the node's latency and error rate, returning its profile"""
+    profile = request.app['nodes'].get(request.match_info.get('node', ''))
+    if profile is None:
+        raise web.HTTPNotFound(text=f"no simulated node {request.match_info['node']!r}")
+    delay = profile.sample_latency()
+    if delay:
+        await asyncio.sleep(delay)
+    if profile.fails():
+        raise web.HTTPInternalServerError(text=json.dumps({'error': 'simulated failure'}), content_type='application/json')
+    return profile
+
+
+async def get_actions_handler(request):
+    profile = await simulate(request)
+    chain = request.app['chain']
+    query = request.query
+    now = datetime.now(timezone.utc).timestamp()
+
+    # Only what this node has indexed is visible
+    end = bisect.bisect_right(chain.times, now - profile.staleness())
+    start = 0
+    if query.get('after'):
+        # Like Hyperion, 'after' is inclusive (gte): a block's other actions share its timestamp
+        start = bisect.bisect_left(chain.times, parse_chain_time(query['after']).timestamp(), 0, end)
+    if query.get('global_sequence'):
+        low, _, high = query['global_sequence'].partition('-')
+        start = max(start, bisect.bisect_left(chain.sequences, int(low), 0, end))
+        if high:
+            end = min(end, bisect.bisect_right(chain.sequences, int(high), 0, end))
+
+    matched = [action for action in chain.actions[start:end] if matches_query(action, query)]
+    if query.get('sort', 'desc') in ('desc', '-1'):
+        matched.reverse()
+    skip = int(query.get('skip', 0))
+    limit = int(query.get('limit', 10))
+    page = matched[skip:skip + limit]
+    if profile.pad:
+        page = [dict(action, padding='x' * profile.pad) for action in page]
+
+    indexed_time = now - profile.staleness()
+    return web.json_response({
+        'query_time_ms': 1.0,
+        'cached': False,
+        'lib': max(0, chain.head_block() - 330),
+        'last_indexed_block': chain.head_block() - int(profile.staleness() / BLOCK_SECONDS),
+        'last_indexed_block_time': chain_time(datetime.fromtimestamp(indexed_time, timezone.utc)),
+        'total': {'value': len(matched), 'relation': 'eq'},
+        'actions': page
+    })
+
+
+async def health_handler(request):
+    profile = await simulate(request)
+    chain = request.app['chain']
+    now = datetime.now(timezone.utc).timestamp()
+    head_block = chain.head_block() - int(profile.head_lag / BLOCK_SECONDS)
+    head_offset = int(profile.index_lag / BLOCK_SECONDS)
+    return web.json_response({
+        'version': 'mock',
+        'host': request.host,
+        'health': [
+            {
+                'service': 'NodeosRPC',
+                'status': 'OK',
+                'service_data': {
+                    'head_block_num': head_block,
+                    'head_block_time': chain_time(datetime.fromtimestamp(now - profile.head_lag, timezone.utc)),
+                    'time_offset': int(profile.head_lag * 1000),
+                    'last_irreversible_block': max(0, head_block - 330)
+                }
+            },
+            {
+                'service': 'Elasticsearch',
+                'status': 'OK',
+                'service_data': {
+                    'last_indexed_block': head_block - head_offset,
+                    'head_offset': head_offset,
+                    'missing_blocks': 0
+                }
+            }
+        ],
+        'query_time_ms': 1.0
+    })
+
+
+# ------------------------------------------------------------------
+# 4.  Stream API (socket.io v5 over a raw Engine.IO v4 websocket)
+# ------------------------------------------------------------------
+def matches_request(action, request):
+    """Whether an action satisfies an action_stream_request"""
+    act = action['act']
+    if request.get('contract') not in ('*', act['account']):
+        return False
+    if request.get('action') not in ('*', act['name']):
+        return False
+    for stream_filter in request.get('filters', []):
+        value = action
+        for part in stream_filter['field'].split('.'):
+            value = value.get(part, {}) if isinstance(value, dict) else None
+        if value != stream_filter['value']:
+            return False
+    return True
+
+
+async def stream_handler(request):
+    app = request.app
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+
+    ping_interval = app['ping_interval']
+    await ws.send_str('0' + json.dumps({
+        'sid': uuid.uuid4().hex,
+        'upgrades': [],
+        'pingInterval': int(ping_interval * 1000),
+        'pingTimeout': 20000,
+        'maxPayload': 1000000
+    }))
+
+    subscriptions = []  # [(action_stream_request, last global_sequence sent from history)]
+    connected_at = asyncio.get_running_loop().time()
+    live = asyncio.Queue()
+    app['chain'].subscribers.add(live)
+
+    async def pinger():
+        while not ws.closed:
+            await asyncio.sleep(ping_interval)
+            await ws.send_str('2')
+
+    async def send_action(action, mode):
+        message = {'type': 'action_trace', 'mode': mode, 'message': json.dumps(action)}
+        await ws.send_str('42' + json.dumps(['message', message]))
+
+    async def emitter():
+        while not ws.closed:
+            try:
+                item = await asyncio.wait_for(live.get(), ping_interval)
+            except asyncio.TimeoutError:
+                item = None
+            if app['drop_after'] and asyncio.get_running_loop().time() - connected_at > app['drop_after']:
+                print("Dropping stream connection")
+                await ws.close()
+                return
+            if isinstance(item, tuple):
+                # A new subscription: replay its history from start_from, then
+                # join the live feed. Queued live actions it already covered
+                # are skipped, so nothing is sent twice or out of order.
+                _, subscription = item
+                history = [action for action in app['chain'].history(subscription.get('start_from'))
+                           if matches_request(action, subscription)]
+                for action in history:
+                    await send_action(action, 'history')
+                replayed = int(history[-1]['global_sequence']) if history else -1
+                subscriptions.append((subscription, replayed))
+            elif item and any(matches_request(item, subscription) and int(item['global_sequence']) > replayed
+                              for subscription, replayed in subscriptions):
+                await send_action(item, 'live')
+
+    tasks = [asyncio.create_task(pinger()), asyncio.create_task(emitter())]
+    try:
+        async for msg in ws:
+            packet = msg.data
+            if packet == '40':
+                await ws.send_str('40' + json.dumps({'sid': uuid.uuid4().hex}))
+            elif packet.startswith('42'):
+                body = packet[2:]
+                ack_id = body[:len(body) - len(body.lstrip('0123456789'))]
+                event = json.loads(body[len(ack_id):])
+                if event[0] == 'action_stream_request':
+                    # Queued behind the live actions already waiting, so the emitter takes them in order
+                    live.put_nowait(('subscribe', event[1]))
+                    print(f"Stream subscription: {event[1]}")
+                    await ws.send_str(f"43{ack_id}" + json.dumps([{'status': 'OK', 'reqUUID': uuid.uuid4().hex}]))
+    finally:
+        app['chain'].subscribers.discard(live)
+        for task in tasks:
+            task.cancel()
+    return ws
+
+
+# ------------------------------------------------------------------
+# 5.  Entry-point
+# ------------------------------------------------------------------
+def parse_burst(spec):
+    """'COUNT@SECONDS' -> (count, seconds)"""
+    count, _, at = spec.partition('@')
+    return int(count), float(at or 0)
+
+
+def build_app(args):
+    app = web.Application()
+    chain = Chain(ActionSource(args.contract), getattr(args, 'history', 100_000))
+    for path in getattr(args, 'script', None) or []:
+        chain.load_script(path)
+    app['chain'] = chain
+    app['ping_interval'] = args.ping_interval
+    app['drop_after'] = args.drop_after
+
+    # Root node plus one path prefix per --node
+    nodes = {'': NodeProfile('default')}
+    for spec in getattr(args, 'node', None) or []:
+        profile = NodeProfile(spec)
+        nodes[profile.name] = profile
+        print(f"Serving node /{profile.describe()}")
+    app['nodes'] = nodes
+
+    for prefix in ('', '/{node}'):
+        app.router.add_get(f'{prefix}/v2/history/get_actions', get_actions_handler)
+        app.router.add_get(f'{prefix}/v2/health', health_handler)
+        app.router.add_get(f'{prefix}/stream/', stream_handler)
+
+    async def start_producer(app):
+        app['producer'] = asyncio.create_task(chain.produce(args.rate, [parse_burst(spec) for spec in getattr(args, 'burst', None) or []]))
+
+    async def stop_producer(app):
+        app['producer'].cancel()
+
+    app.on_startup.append(start_producer)
+    app.on_cleanup.append(stop_producer)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7000)
+    parser.add_argument('--contract', default='farmforhoney')
+    parser.add_argument('--rate', type=float, default=1.0, help="Average actions per second (0 = scripted/bursts only)")
+    parser.add_argument('--burst', action='append', help="Add COUNT actions at once, SECONDS after start (COUNT@SECONDS), repeatable")
+    parser.add_argument('--script', action='append', help="Recorded actions to preload (.json get_actions response or NDJSON), repeatable")
+    parser.add_argument('--history', type=int, default=100_000, help="Actions kept for get_actions queries")
+    parser.add_argument('--node', action='append', help="Simulated node NAME,key=value,... (see module docstring), repeatable")
+    parser.add_argument('--ping-interval', type=float, default=25.0, help="Seconds between Engine.IO pings")
+    parser.add_argument('--drop-after', type=float, default=0, help="Close each stream after this many seconds (0 = never)")
+    args = parser.parse_args()
+    web.run_app(build_app(args), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()